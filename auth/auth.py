@@ -4,13 +4,22 @@ from fastapi_users.authentication import JWTStrategy
 from fastapi_users import FastAPIUsers
 from .database import User
 from .manager import get_user_manager
+from profiling import timed
 
 bearer_transport = BearerTransport(tokenUrl="/auth/jwt/login")
 
 SECRET = "SECRET"
 
+class TimedJWTStrategy(JWTStrategy):
+    """JWTStrategy, чье время проверки токена попадает в Server-Timing как auth."""
+
+    async def read_token(self, token, user_manager):
+        with timed("auth"):
+            return await super().read_token(token, user_manager)
+
+
 def get_jwt_strategy() -> JWTStrategy:
-    return JWTStrategy(secret=SECRET, lifetime_seconds=3600)
+    return TimedJWTStrategy(secret=SECRET, lifetime_seconds=3600)
 
 auth_backend = AuthenticationBackend(
     name="jwt",
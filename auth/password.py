@@ -0,0 +1,144 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+from fastapi_users.password import PasswordHelper
+from pwdlib import PasswordHash
+from pwdlib.hashers.argon2 import Argon2Hasher
+from pwdlib.hashers.bcrypt import BcryptHasher
+
+from config import (
+    PASSWORD_HASH_ALGORITHM, PASSWORD_BCRYPT_ROUNDS,
+    PASSWORD_ARGON2_TIME_COST, PASSWORD_ARGON2_MEMORY_COST, PASSWORD_ARGON2_PARALLELISM,
+    PASSWORD_HASH_EXECUTOR, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_CONCURRENCY,
+)
+from profiling import timed
+
+_password_hash: Optional[PasswordHash] = None
+
+
+def build_password_hash() -> PasswordHash:
+    """Собирает PasswordHash из config: первый хэшер - основной, остальные только для проверки.
+
+    Хэши, созданные неосновным алгоритмом или с другими параметрами,
+    pwdlib пересчитывает при успешной проверке (verify_and_update).
+    """
+    argon2 = Argon2Hasher(
+        time_cost=PASSWORD_ARGON2_TIME_COST,
+        memory_cost=PASSWORD_ARGON2_MEMORY_COST,
+        parallelism=PASSWORD_ARGON2_PARALLELISM,
+    )
+    bcrypt = BcryptHasher(rounds=PASSWORD_BCRYPT_ROUNDS)
+    if PASSWORD_HASH_ALGORITHM == "bcrypt":
+        return PasswordHash((bcrypt, argon2))
+    if PASSWORD_HASH_ALGORITHM == "argon2":
+        return PasswordHash((argon2, bcrypt))
+    raise ValueError(f"Unknown PASSWORD_HASH_ALGORITHM: {PASSWORD_HASH_ALGORITHM}")
+
+
+def _get_password_hash() -> PasswordHash:
+    # Создается лениво в каждом процессе: так функции ниже работают и в ProcessPoolExecutor
+    global _password_hash
+    if _password_hash is None:
+        _password_hash = build_password_hash()
+    return _password_hash
+
+
+def _hash(password: str) -> str:
+    return _get_password_hash().hash(password)
+
+
+def _verify_and_update(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    return _get_password_hash().verify_and_update(plain_password, hashed_password)
+
+
+class PooledPasswordHelper(PasswordHelper):
+    """PasswordHelper, который выносит хэширование из event loop в пул.
+
+    Синхронные методы базового класса остаются для редких путей fastapi_users
+    (сброс пароля, OAuth); регистрация и вход используют *_async-варианты.
+    Одновременно в пул попадает не больше max_concurrency задач, остальные
+    ждут на семафоре - их число видно в metrics() как queue_depth.
+    """
+
+    def __init__(self, executor: Executor, max_concurrency: int):
+        super().__init__(_get_password_hash())
+        self.executor = executor
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.total_seconds = 0.0
+
+    async def _run(self, func, *args):
+        with timed("auth"):
+            return await self._run_pooled(func, *args)
+
+    async def _run_pooled(self, func, *args):
+        self.queue_depth += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queue_depth -= 1
+        self.in_flight += 1
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            future = self.executor.submit(func, *args)
+        except BaseException:
+            self._release(started)
+            raise
+        # Разрешение возвращается, когда задача действительно закончилась в пуле, а не
+        # когда отменили ожидающий запрос: иначе при обрывах соединений в пуле
+        # одновременно окажется больше max_concurrency хэшей.
+        future.add_done_callback(lambda _: self._release_threadsafe(loop, started))
+        return await asyncio.wrap_future(future)
+
+    def _release_threadsafe(self, loop: asyncio.AbstractEventLoop, started: float) -> None:
+        try:
+            loop.call_soon_threadsafe(self._release, started)
+        except RuntimeError:
+            # Цикл уже закрыт при остановке приложения
+            pass
+
+    def _release(self, started: float) -> None:
+        self.total_seconds += time.perf_counter() - started
+        self.in_flight -= 1
+        self.completed += 1
+        self._semaphore.release()
+
+    async def hash_async(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify_and_update_async(
+        self, plain_password: str, hashed_password: str
+    ) -> tuple[bool, Optional[str]]:
+        return await self._run(_verify_and_update, plain_password, hashed_password)
+
+    def metrics(self) -> dict:
+        return {
+            "executor": PASSWORD_HASH_EXECUTOR,
+            "algorithm": PASSWORD_HASH_ALGORITHM,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "avg_seconds": self.total_seconds / self.completed if self.completed else 0.0,
+        }
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _create_executor() -> Executor:
+    if PASSWORD_HASH_EXECUTOR == "process":
+        return ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+    return ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+
+
+password_helper = PooledPasswordHelper(_create_executor(), PASSWORD_HASH_MAX_CONCURRENCY)
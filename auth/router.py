@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends
+
+from .auth import fastapi_users
+from .database import User
+from .password import password_helper
+
+router = APIRouter(
+    prefix="/auth",
+    tags=["Auth"]
+)
+
+get_current_superuser = fastapi_users.current_user(active=True, superuser=True)
+
+@router.get(
+    "/password-hashing/metrics",
+    summary="Метрики пула хэширования паролей",
+    description="Текущая очередь и загрузка пула, в котором хэшируются пароли. Только для суперпользователей."
+)
+async def get_password_hashing_metrics(user: User = Depends(get_current_superuser)):
+    return password_helper.metrics()
@@ -0,0 +1,158 @@
+"""Сравнение поиска ссылки по коду: OR по двум индексам против одного покрывающего индекса.
+
+Создает две временные таблицы с одинаковыми данными:
+- bench_links_or: short_code и custom_alias с отдельными уникальными индексами
+  (схема до миграции 8d2f6a9c4e51), запрос `short_code = $1 OR custom_alias = $1`;
+- bench_links_lookup: один уникальный индекс по short_code с INCLUDE
+  (id, original_url, expires_at), запрос `short_code = $1`.
+
+Ограничение: сразу после VACUUM таблицы только читаются, и visibility map полностью
+заполнена, поэтому index-only scan не ходит в кучу. В рабочем сервисе каждый редирект
+выполняет UPDATE access_count (record_access), который сбрасывает биты visibility map
+на горячих страницах, и часть выигрыша покрывающего индекса пропадает до следующего
+autovacuum. Чтобы измерить это, используйте --writers N: N соединений параллельно
+с замером обновляют access_count и last_accessed у тех же кодов, что и читаются.
+
+Запуск (нужен доступный Postgres из config.py):
+    python -m benchmarks.lookup_benchmark --rows 5000000 --queries 20000 --writers 2
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import asyncpg
+
+from config import DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER
+
+OR_QUERY = """
+    SELECT id, short_code, original_url FROM bench_links_or
+    WHERE (short_code = $1 OR custom_alias = $1)
+      AND (expires_at IS NULL OR expires_at > now())
+"""
+LOOKUP_QUERY = """
+    SELECT id, short_code, original_url FROM bench_links_lookup
+    WHERE short_code = $1
+      AND (expires_at IS NULL OR expires_at > now())
+"""
+
+
+async def seed(conn: asyncpg.Connection, rows: int) -> None:
+    print(f"Seeding {rows} rows...")
+    await conn.execute("DROP TABLE IF EXISTS bench_links_or, bench_links_lookup")
+    # Каждая десятая ссылка получает алиас; как и в create_link, алиас лежит и в short_code
+    await conn.execute(
+        """
+        CREATE TABLE bench_links_or AS
+        SELECT g AS id,
+               'https://example.com/some/long/path/' || md5(g::text) AS original_url,
+               CASE WHEN g % 10 = 0 THEN 'alias-' || g ELSE substr(md5('c' || g), 1, 7) || g END AS short_code,
+               CASE WHEN g % 10 = 0 THEN 'alias-' || g END AS custom_alias,
+               CASE WHEN g % 3 = 0 THEN now() + interval '30 days' END AS expires_at,
+               0 AS access_count,
+               NULL::timestamptz AS last_accessed
+        FROM generate_series(1, $1::int) AS g
+        """,
+        rows,
+    )
+    await conn.execute("CREATE TABLE bench_links_lookup AS SELECT * FROM bench_links_or")
+    await conn.execute("CREATE UNIQUE INDEX ON bench_links_or (short_code)")
+    await conn.execute("CREATE UNIQUE INDEX ON bench_links_or (custom_alias)")
+    await conn.execute(
+        "CREATE UNIQUE INDEX ON bench_links_lookup (short_code) INCLUDE (id, original_url, expires_at)"
+    )
+    # VACUUM заполняет visibility map, без нее index-only scan все равно ходит в кучу
+    await conn.execute("VACUUM ANALYZE bench_links_or")
+    await conn.execute("VACUUM ANALYZE bench_links_lookup")
+
+
+async def sample_codes(conn: asyncpg.Connection, count: int) -> list[str]:
+    rows = await conn.fetch(
+        "SELECT short_code FROM bench_links_or TABLESAMPLE SYSTEM (1) LIMIT $1", count
+    )
+    codes = [row["short_code"] for row in rows]
+    # Четверть запросов - промахи, как у ботов и опечаток
+    codes += [f"missing{i}" for i in range(len(codes) // 3)]
+    random.shuffle(codes)
+    return codes
+
+
+async def run_queries(conn: asyncpg.Connection, query: str, codes: list[str]) -> float:
+    statement = await conn.prepare(query)
+    started = time.perf_counter()
+    for code in codes:
+        await statement.fetchrow(code)
+    return time.perf_counter() - started
+
+
+async def record_access_loop(table: str, codes: list[str], stop: asyncio.Event) -> int:
+    """Повторяет UPDATE из record_access по кругу, пока не выставлен stop."""
+    conn = await asyncpg.connect(
+        user=DB_USER, password=DB_PASS, host=DB_HOST, port=int(DB_PORT), database=DB_NAME
+    )
+    try:
+        statement = await conn.prepare(
+            f"UPDATE {table} SET access_count = access_count + 1, last_accessed = now() "
+            "WHERE short_code = $1"
+        )
+        updates = 0
+        while not stop.is_set():
+            await statement.fetch(random.choice(codes))
+            updates += 1
+        return updates
+    finally:
+        await conn.close()
+
+
+async def explain(conn: asyncpg.Connection, query: str, code: str) -> str:
+    rows = await conn.fetch(f"EXPLAIN (ANALYZE, BUFFERS) {query}", code)
+    return "\n".join(row[0] for row in rows)
+
+
+async def main(rows: int, queries: int, reseed: bool, writers: int) -> None:
+    conn = await asyncpg.connect(
+        user=DB_USER, password=DB_PASS, host=DB_HOST, port=int(DB_PORT), database=DB_NAME
+    )
+    try:
+        # Таблицы от прошлых версий бенчмарка без access_count пересоздаются
+        exists = await conn.fetchval(
+            "SELECT EXISTS (SELECT 1 FROM information_schema.columns "
+            "WHERE table_name = 'bench_links_lookup' AND column_name = 'access_count')"
+        )
+        if reseed or not exists:
+            await seed(conn, rows)
+        codes = await sample_codes(conn, queries)
+
+        for name, query in (("OR over two indexes", OR_QUERY), ("single covering index", LOOKUP_QUERY)):
+            table = "bench_links_or" if query is OR_QUERY else "bench_links_lookup"
+            # Прогрев, чтобы сравнивать горячий кэш с горячим
+            await run_queries(conn, query, codes[:1000])
+            stop = asyncio.Event()
+            writer_tasks = [
+                asyncio.create_task(record_access_loop(table, codes, stop)) for _ in range(writers)
+            ]
+            try:
+                elapsed = await run_queries(conn, query, codes)
+            finally:
+                stop.set()
+                updates = sum(await asyncio.gather(*writer_tasks))
+            print(f"\n== {name}: {len(codes)} lookups in {elapsed:.3f}s "
+                  f"({len(codes) / elapsed:.0f} qps, {elapsed / len(codes) * 1e6:.1f} us/lookup, "
+                  f"{updates} concurrent updates)")
+            print(await explain(conn, query, codes[0]))
+            print(await explain(conn, query, "missing-code"))
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=20_000)
+    parser.add_argument("--reseed", action="store_true", help="Пересоздать таблицы даже если они уже есть")
+    parser.add_argument(
+        "--writers", type=int, default=0,
+        help="Число соединений, параллельно выполняющих UPDATE как record_access",
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.queries, args.reseed, args.writers))
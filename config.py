@@ -11,9 +11,55 @@ DB_NAME = os.getenv("DB_NAME", "postgres")
 
 DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
+# Хранилище ссылок: postgres | sqlite | memory
+LINK_STORAGE_BACKEND = os.getenv("LINK_STORAGE_BACKEND", "postgres")
+LINK_SQLITE_PATH = os.getenv("LINK_SQLITE_PATH", "links.db")
+
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
 
+# Отслеживание "горячих" коротких кодов (Count-Min Sketch + Space-Saving)
+HEAVY_HITTERS_WIDTH = int(os.getenv("HEAVY_HITTERS_WIDTH", 2048))
+HEAVY_HITTERS_DEPTH = int(os.getenv("HEAVY_HITTERS_DEPTH", 4))
+HEAVY_HITTERS_TOP_K = int(os.getenv("HEAVY_HITTERS_TOP_K", 100))
+HEAVY_HITTERS_FLUSH_INTERVAL = int(os.getenv("HEAVY_HITTERS_FLUSH_INTERVAL", 10))
+HEAVY_HITTERS_WINDOW = int(os.getenv("HEAVY_HITTERS_WINDOW", 3600))
+REDIS_REDIRECT_HOT_TTL = int(os.getenv("REDIS_REDIRECT_HOT_TTL", 86400))
+
+# Уникальные посетители (HyperLogLog в Redis)
+UNIQUE_VISITORS_DAILY_TTL_DAYS = int(os.getenv("UNIQUE_VISITORS_DAILY_TTL_DAYS", 90))
+UNIQUE_VISITORS_PERSIST_INTERVAL = int(os.getenv("UNIQUE_VISITORS_PERSIST_INTERVAL", 60))
+
+# Кэширование редиректов в браузерах и CDN
+PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "http://localhost:8008")
+# max-age для 301/308 без cache_max_age: без явного заголовка браузер кэширует их навсегда
+PERMANENT_REDIRECT_MAX_AGE = int(os.getenv("PERMANENT_REDIRECT_MAX_AGE", 86400))
+CDN_PURGE_BACKEND = os.getenv("CDN_PURGE_BACKEND", "none")  # none | local | http
+CDN_PURGE_URL = os.getenv("CDN_PURGE_URL", "")
+CDN_PURGE_TOKEN = os.getenv("CDN_PURGE_TOKEN")
+
+# Edge-режим: редиректы из снимка в памяти без обращения к Postgres
+EDGE_SNAPSHOT_PATH = os.getenv("EDGE_SNAPSHOT_PATH", "snapshots/links.snap")
+EDGE_RELOAD_INTERVAL = int(os.getenv("EDGE_RELOAD_INTERVAL", 5))
+
+# Хэширование паролей (выполняется в пуле, а не в event loop)
+PASSWORD_HASH_ALGORITHM = os.getenv("PASSWORD_HASH_ALGORITHM", "argon2")  # argon2 | bcrypt
+PASSWORD_BCRYPT_ROUNDS = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", 12))
+PASSWORD_ARGON2_TIME_COST = int(os.getenv("PASSWORD_ARGON2_TIME_COST", 3))
+PASSWORD_ARGON2_MEMORY_COST = int(os.getenv("PASSWORD_ARGON2_MEMORY_COST", 65536))
+PASSWORD_ARGON2_PARALLELISM = int(os.getenv("PASSWORD_ARGON2_PARALLELISM", 4))
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")  # thread | process
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 4))
+PASSWORD_HASH_MAX_CONCURRENCY = int(os.getenv("PASSWORD_HASH_MAX_CONCURRENCY", 4))
+
+# Профилирование запросов (Server-Timing и flame graph), по умолчанию выключено
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", 0.0))
+PROFILING_HEADER = os.getenv("PROFILING_HEADER", "X-Profile")
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN")
+PROFILING_FLAMEGRAPH_DIR = os.getenv("PROFILING_FLAMEGRAPH_DIR", "")
+PROFILING_FLAMEGRAPH_INTERVAL = float(os.getenv("PROFILING_FLAMEGRAPH_INTERVAL", 0.001))
+
 SECRET = "SECRET"
 
 
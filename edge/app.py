@@ -0,0 +1,69 @@
+"""Read-only приложение для edge-узлов: редиректы из снимка без Postgres и Redis.
+
+    EDGE_SNAPSHOT_PATH=snapshots/links.snap uvicorn edge.app:app
+
+Снимок и дельты перечитываются каждые EDGE_RELOAD_INTERVAL секунд без перезапуска.
+Переходы здесь не учитываются в статистике. Код редиректа и Cache-Control берутся
+из политики ссылки так же, как в основном приложении.
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, status
+from fastapi.responses import RedirectResponse
+
+from config import EDGE_SNAPSHOT_PATH, EDGE_RELOAD_INTERVAL
+from links import redirect_policy
+from .snapshot import SnapshotStore
+
+store: SnapshotStore | None = None
+
+
+async def run_reload_loop(interval: int = EDGE_RELOAD_INTERVAL) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            store.reload_if_changed()
+        except Exception as e:
+            print(f"Error reloading redirect snapshot: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global store
+    print(f"Edge startup: loading snapshot {EDGE_SNAPSHOT_PATH}...")
+    store = SnapshotStore(EDGE_SNAPSHOT_PATH)
+    reload_task = asyncio.create_task(run_reload_loop())
+    yield
+    reload_task.cancel()
+    store.snapshot.close()
+
+
+app = FastAPI(
+    title="URL Shortener Edge",
+    description="Read-only редиректы из локального снимка ссылок.",
+    version="0.1.0",
+    lifespan=lifespan
+)
+
+
+@app.get(
+    "/{short_code}",
+    status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+    tags=["Redirect"],
+    summary="Перенаправление по короткой ссылке (из снимка)",
+)
+async def redirect_from_snapshot(short_code: str):
+    entry = store.lookup(short_code)
+    now = time.time()
+    if entry is None or entry.is_expired(now):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Ссылка не найдена или срок ее действия истек."
+        )
+    response = RedirectResponse(url=entry.url, status_code=entry.status)
+    cache_control = redirect_policy.cache_control(entry, now)
+    if cache_control:
+        response.headers["Cache-Control"] = cache_control
+    return response
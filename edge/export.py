@@ -0,0 +1,160 @@
+"""Экспорт таблицы links в снимок для edge-узлов.
+
+    python -m edge.export                        # полный снимок в EDGE_SNAPSHOT_PATH
+    python -m edge.export --delta                # дельта от последнего снимка или дельты
+    python -m edge.export --delta-since 2026-10-18T12:00:00+00:00
+
+Полный снимок читается через серверный курсор порциями по --batch-size строк
+и подменяет старый файл атомарно. Чтение идет в одной транзакции REPEATABLE READ,
+а ее now() записывается в заголовок снимка как watermark.
+
+Дельта содержит ссылки, созданные или измененные (links.updated_at), и удаленные
+(link_tombstones) после начала дельты, и кладется в каталог `<snapshot>.d/`,
+откуда ее подхватит edge.app. Начало сдвигается назад на --overlap секунд:
+транзакция, начатая до watermark, могла закоммититься уже после снятия снимка.
+Повторно примененное изменение ничего не портит - в дельте всегда текущее состояние.
+"""
+import argparse
+import asyncio
+import datetime
+import os
+
+from sqlalchemy import func, select
+
+from auth.database import engine
+from config import EDGE_SNAPSHOT_PATH, LINK_STORAGE_BACKEND
+from models.models import Link, LinkTombstone
+from .snapshot import Snapshot, read_delta_until, to_watermark, write_delta, write_snapshot
+
+DEFAULT_OVERLAP_SECONDS = 300
+
+
+async def stream_active_links(conn, batch_size: int):
+    """Отдает (code, url, expires_at, redirect_status, cache_max_age) по серверному курсору
+    в байтовом порядке кодов."""
+    statement = (
+        select(
+            Link.short_code, Link.original_url, Link.expires_at,
+            Link.redirect_status, Link.cache_max_age,
+        )
+        .where((Link.expires_at == None) | (Link.expires_at > func.now()))
+        # COLLATE "C" дает байтовый порядок, по которому снимок ищет бинарным поиском
+        .order_by(Link.short_code.collate("C"))
+    )
+    result = await conn.stream(statement.execution_options(yield_per=batch_size))
+    async for row in result:
+        yield row.short_code, row.original_url, row.expires_at, row.redirect_status, row.cache_max_age
+
+
+async def _begin_consistent_read():
+    conn = await engine.connect()
+    conn = await conn.execution_options(isolation_level="REPEATABLE READ")
+    await conn.begin()
+    # now() - начало транзакции; все, что видно в ней, закоммичено не позже
+    watermark = to_watermark(await conn.scalar(select(func.now())))
+    return conn, watermark
+
+
+async def export_snapshot(path: str, batch_size: int) -> int:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn, watermark = await _begin_consistent_read()
+    try:
+        return await write_snapshot(path, stream_active_links(conn, batch_size), watermark)
+    finally:
+        await conn.close()
+
+
+async def _collect_changes(conn, since: datetime.datetime) -> list[dict]:
+    changes = []
+    links = await conn.execute(
+        select(
+            Link.short_code, Link.original_url, Link.expires_at,
+            Link.redirect_status, Link.cache_max_age, Link.updated_at,
+        )
+        .where(Link.updated_at > since)
+    )
+    for row in links:
+        changes.append((row.updated_at, {
+            "code": row.short_code,
+            "url": row.original_url,
+            "expires_at": row.expires_at.isoformat() if row.expires_at else None,
+            "status": row.redirect_status,
+            "max_age": row.cache_max_age,
+        }))
+    tombstones = await conn.execute(
+        select(LinkTombstone.short_code, LinkTombstone.deleted_at)
+        .where(LinkTombstone.deleted_at > since)
+    )
+    for row in tombstones:
+        changes.append((row.deleted_at, {"code": row.short_code, "deleted": True}))
+    # По времени изменения: удаленный и заново созданный код окажется живым
+    changes.sort(key=lambda change: change[0])
+    return [change for _, change in changes]
+
+
+def latest_watermark(path: str) -> int:
+    """До какого момента изменения уже выгружены: watermark снимка или until последней дельты."""
+    snapshot = Snapshot(path)
+    try:
+        watermark = snapshot.watermark
+    finally:
+        snapshot.close()
+    delta_dir = f"{path}.d"
+    if os.path.isdir(delta_dir):
+        for name in os.listdir(delta_dir):
+            if name.endswith(".ndjson"):
+                watermark = max(watermark, read_delta_until(os.path.join(delta_dir, name)))
+    return watermark
+
+
+async def export_delta(path: str, since: datetime.datetime, overlap: int) -> int:
+    delta_dir = f"{path}.d"
+    os.makedirs(delta_dir, exist_ok=True)
+    conn, until = await _begin_consistent_read()
+    try:
+        changes = await _collect_changes(conn, since - datetime.timedelta(seconds=overlap))
+    finally:
+        await conn.close()
+    # until (микросекунды) в имени делает файлы двух запусков в одну секунду разными
+    stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%S")
+    write_delta(os.path.join(delta_dir, f"{stamp}-{until}.ndjson"), to_watermark(since), until, changes)
+    return len(changes)
+
+
+async def main(args: argparse.Namespace) -> None:
+    if LINK_STORAGE_BACKEND != "postgres":
+        raise RuntimeError("Edge export reads links from Postgres and requires LINK_STORAGE_BACKEND=postgres")
+    try:
+        if args.delta or args.delta_since:
+            since = args.delta_since
+            if since is not None and since.tzinfo is None:
+                since = since.replace(tzinfo=datetime.timezone.utc)
+            if since is None:
+                epoch = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+                since = epoch + datetime.timedelta(microseconds=latest_watermark(args.output))
+            count = await export_delta(args.output, since, args.overlap)
+            print(f"Wrote delta with {count} changes since {since.isoformat()} for {args.output}")
+        else:
+            count = await export_snapshot(args.output, args.batch_size)
+            print(f"Wrote snapshot {args.output} with {count} links")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Экспорт ссылок в снимок для edge-узлов")
+    parser.add_argument("--output", default=EDGE_SNAPSHOT_PATH)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument(
+        "--delta", action="store_true",
+        help="Записать дельту с момента, до которого выгружены снимок и существующие дельты",
+    )
+    parser.add_argument(
+        "--delta-since", type=datetime.datetime.fromisoformat, default=None,
+        help="Записать дельту из ссылок, измененных после указанного момента (ISO 8601)",
+    )
+    parser.add_argument(
+        "--overlap", type=int, default=DEFAULT_OVERLAP_SECONDS,
+        help="На сколько секунд раньше начала дельты брать изменения",
+    )
+    asyncio.run(main(parser.parse_args()))
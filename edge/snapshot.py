@@ -0,0 +1,274 @@
+"""Неизменяемый снимок редиректов для edge-узлов без доступа к Postgres.
+
+Формат файла (все числа little-endian):
+
+    заголовок   MAGIC (8 байт) | версия u32 | число записей u32 | смещение блока URL u64 | watermark i64
+    индекс      записи фиксированной длины, отсортированные по коду (байтовый порядок):
+                код (CODE_SIZE байт, дополнен нулями) | смещение URL u64 | длина URL u32 | expires_at i64 |
+                код редиректа u16 | cache_max_age i32
+    блок URL    URL в UTF-8 подряд, без разделителей
+
+expires_at хранится в секундах Unix, 0 - ссылка бессрочная; cache_max_age -1 - не задан.
+watermark - момент по часам БД (микросекунды Unix), на который снят снимок: все изменения
+до него в снимке уже есть, дельты применяются только если заканчиваются позже.
+Поиск - бинарный поиск прямо по mmap, без загрузки файла в память.
+"""
+import datetime
+import json
+import mmap
+import os
+import struct
+import tempfile
+from typing import AsyncIterable, Iterable, Optional
+
+from links.redirect_policy import DEFAULT_REDIRECT_STATUS, CachedRedirect
+
+MAGIC = b"SURLSNAP"
+VERSION = 3
+CODE_SIZE = 32
+HEADER = struct.Struct("<8sIIQq")
+RECORD = struct.Struct(f"<{CODE_SIZE}sQIqHi")
+NO_MAX_AGE = -1
+
+
+def _encode_code(code: str) -> bytes:
+    raw = code.encode("ascii")
+    if len(raw) > CODE_SIZE:
+        raise ValueError(f"Код {code!r} длиннее {CODE_SIZE} байт")
+    return raw.ljust(CODE_SIZE, b"\0")
+
+
+def _to_utc(value: datetime.datetime) -> datetime.datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=datetime.timezone.utc)
+    return value
+
+
+def _to_epoch(expires_at: Optional[datetime.datetime]) -> int:
+    if expires_at is None:
+        return 0
+    return int(_to_utc(expires_at).timestamp())
+
+
+def to_watermark(moment: datetime.datetime) -> int:
+    """Момент времени в микросекундах Unix (формат watermark снимка и дельт)."""
+    delta = _to_utc(moment) - datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+    return delta // datetime.timedelta(microseconds=1)
+
+
+async def write_snapshot(
+    path: str,
+    records: AsyncIterable[tuple[str, str, Optional[datetime.datetime], int, Optional[int]]],
+    watermark: int,
+) -> int:
+    """Пишет снимок из потока (code, url, expires_at, redirect_status, cache_max_age),
+    отсортированного по коду.
+
+    Индекс и URL пишутся во временные файлы по мере чтения потока, поэтому память
+    не зависит от размера таблицы. Готовый файл подменяет старый через os.replace,
+    так что читатели всегда видят либо старый, либо новый снимок целиком.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    count = 0
+    url_offset = 0
+    previous_code = b""
+    with tempfile.TemporaryFile(dir=directory) as index_file, \
+            tempfile.TemporaryFile(dir=directory) as urls_file:
+        async for code, url, expires_at, redirect_status, cache_max_age in records:
+            encoded_code = _encode_code(code)
+            if encoded_code <= previous_code:
+                raise ValueError("Записи снимка должны быть отсортированы по коду без повторов")
+            previous_code = encoded_code
+            encoded_url = url.encode("utf-8")
+            index_file.write(RECORD.pack(
+                encoded_code, url_offset, len(encoded_url), _to_epoch(expires_at),
+                redirect_status or DEFAULT_REDIRECT_STATUS,
+                NO_MAX_AGE if cache_max_age is None else cache_max_age,
+            ))
+            urls_file.write(encoded_url)
+            url_offset += len(encoded_url)
+            count += 1
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                out.write(HEADER.pack(MAGIC, VERSION, count, HEADER.size + count * RECORD.size, watermark))
+                for part in (index_file, urls_file):
+                    part.seek(0)
+                    while chunk := part.read(1 << 20):
+                        out.write(chunk)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    return count
+
+
+class Snapshot:
+    """Открытый только на чтение снимок, отображенный в память."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self.identity = (stat.st_ino, stat.st_mtime_ns)
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count, self._urls_offset, self.watermark = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mm.close()
+            raise ValueError(f"{path} не является снимком редиректов версии {VERSION}")
+        self._view = memoryview(self._mm)
+
+    def _code_at(self, i: int) -> bytes:
+        start = HEADER.size + i * RECORD.size
+        return self._mm[start:start + CODE_SIZE]
+
+    def lookup(self, code: str) -> Optional[CachedRedirect]:
+        """Возвращает редирект с его политикой или None.
+
+        Бинарный поиск читает только CODE_SIZE байт на шаг, URL декодируется
+        прямо из memoryview над mmap.
+        """
+        try:
+            key = _encode_code(code)
+        except (UnicodeEncodeError, ValueError):
+            return None
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._code_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == self.count or self._code_at(lo) != key:
+            return None
+        _, url_offset, url_length, expires_at, redirect_status, cache_max_age = RECORD.unpack_from(
+            self._mm, HEADER.size + lo * RECORD.size
+        )
+        start = self._urls_offset + url_offset
+        return CachedRedirect(
+            str(self._view[start:start + url_length], "utf-8"),
+            redirect_status,
+            None if cache_max_age == NO_MAX_AGE else cache_max_age,
+            expires_at or None,
+        )
+
+    def close(self) -> None:
+        self._view.release()
+        self._mm.close()
+
+
+def write_delta(path: str, since: int, until: int, changes: Iterable[dict]) -> None:
+    """Пишет файл дельты: NDJSON со строками {"code", "url", "expires_at", "status", "max_age"}
+    или {"code", "deleted": true}.
+
+    Первая строка - заголовок {"since", "until"} с границами дельты (watermark).
+    Изменения идут в порядке времени, поэтому при повторе кода побеждает последнее.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as out:
+            out.write(json.dumps({"since": since, "until": until}) + "\n")
+            for change in changes:
+                out.write(json.dumps(change, default=str) + "\n")
+        # link, а не replace: файл появляется атомарно, но существующая дельта
+        # не перезаписывается - os.link падает с FileExistsError
+        os.link(tmp_path, path)
+    finally:
+        os.unlink(tmp_path)
+
+
+def read_delta_until(path: str) -> int:
+    """Верхняя граница дельты из ее заголовка; 0 для дельт старого формата без заголовка."""
+    with open(path, encoding="utf-8") as f:
+        first_line = f.readline()
+    return json.loads(first_line).get("until", 0) if first_line.strip() else 0
+
+
+def read_delta(path: str) -> dict[str, Optional[CachedRedirect]]:
+    """Читает дельту в словарь code -> CachedRedirect, None для удаленных ссылок."""
+    overlay: dict[str, Optional[CachedRedirect]] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            change = json.loads(line)
+            if "code" not in change:
+                continue
+            if change.get("deleted"):
+                overlay[change["code"]] = None
+                continue
+            expires_at = change.get("expires_at")
+            if expires_at:
+                expires_at = _to_epoch(datetime.datetime.fromisoformat(expires_at))
+            overlay[change["code"]] = CachedRedirect(
+                change["url"],
+                change.get("status") or DEFAULT_REDIRECT_STATUS,
+                change.get("max_age"),
+                expires_at or None,
+            )
+    return overlay
+
+
+class SnapshotStore:
+    """Снимок плюс наложенные поверх него дельты с горячей подменой.
+
+    Дельты лежат в каталоге `<snapshot>.d/` (файлы *.ndjson) и применяются по возрастанию
+    их until. Дельты, у которых until не позже watermark снимка, игнорируются:
+    все их изменения уже вошли в снимок.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.delta_dir = f"{path}.d"
+        self.snapshot: Optional[Snapshot] = None
+        self.overlay: dict[str, Optional[CachedRedirect]] = {}
+        self._delta_state: Optional[tuple] = None
+        self.reload_if_changed()
+
+    def _current_deltas(self) -> list[tuple[int, str, int]]:
+        if not os.path.isdir(self.delta_dir) or self.snapshot is None:
+            return []
+        deltas = []
+        for name in os.listdir(self.delta_dir):
+            if not name.endswith(".ndjson"):
+                continue
+            delta_path = os.path.join(self.delta_dir, name)
+            until = read_delta_until(delta_path)
+            if until > self.snapshot.watermark:
+                deltas.append((until, delta_path, os.stat(delta_path).st_mtime_ns))
+        return sorted(deltas)
+
+    def reload_if_changed(self) -> bool:
+        """Подменяет снимок и/или дельты, если они изменились на диске. Возвращает True при подмене."""
+        changed = False
+        stat = os.stat(self.path)
+        if self.snapshot is None or self.snapshot.identity != (stat.st_ino, stat.st_mtime_ns):
+            new_snapshot = Snapshot(self.path)
+            old_snapshot, self.snapshot = self.snapshot, new_snapshot
+            # Дельты пересчитываются заново: часть из них уже вошла в новый снимок
+            self._delta_state = None
+            if old_snapshot is not None:
+                old_snapshot.close()
+            print(f"Loaded redirect snapshot {self.path} with {new_snapshot.count} links")
+            changed = True
+
+        deltas = self._current_deltas()
+        if tuple(deltas) != self._delta_state:
+            overlay: dict[str, Optional[CachedRedirect]] = {}
+            for _, delta_path, _ in deltas:
+                overlay.update(read_delta(delta_path))
+            # Одно присваивание - запросы видят либо старый, либо новый набор дельт
+            self.overlay = overlay
+            self._delta_state = tuple(deltas)
+            if deltas:
+                print(f"Applied {len(deltas)} delta files ({len(overlay)} changes)")
+            changed = True
+        return changed
+
+    def lookup(self, code: str) -> Optional[CachedRedirect]:
+        if code in self.overlay:
+            return self.overlay[code]
+        return self.snapshot.lookup(code)
@@ -0,0 +1,309 @@
+"""Массовые выгрузка и загрузка ссылок.
+
+Выгрузка - потоковый NDJSON/CSV для GET /links/export.
+Загрузка - CLI только для Postgres:
+
+    python -m links.bulk import links.ndjson --user-id <uuid> --on-alias-conflict generate
+
+Файл читается порциями, каждая порция грузится через asyncpg COPY во временную
+staging-таблицу. Строки проверяются так же, как в API: URL до 2083 символов, коды
+по шаблону алиаса (негодным кодам выдаются новые). Затем в одной транзакции
+владельцы, которых нет в этой базе, сбрасываются в NULL, разрешаются конфликты кодов,
+недостающие коды выделяются пачкой, и все строки переносятся в links одним INSERT ... SELECT.
+"""
+import argparse
+import asyncio
+import csv
+import datetime
+import io
+import json
+import re
+import secrets
+import uuid
+from typing import AsyncIterator, Iterator, Optional
+
+import asyncpg
+
+from config import DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER, LINK_STORAGE_BACKEND
+from .redirect_policy import (
+    DEFAULT_REDIRECT_STATUS, REDIRECT_STATUSES, MIN_CACHE_MAX_AGE, MAX_CACHE_MAX_AGE,
+)
+
+EXPORT_FIELDS = [
+    "short_code", "custom_alias", "original_url", "created_at",
+    "expires_at", "last_accessed", "access_count", "user_id",
+    "redirect_status", "cache_max_age",
+]
+EXPORT_CHUNK_ROWS = 500
+
+ALIAS_PATTERN = re.compile(r"^[a-zA-Z0-9_-]{3,30}$")
+# Тот же лимит, что у HttpUrl в API: на нем держится размер строки покрывающего индекса
+MAX_URL_LENGTH = 2083
+CODE_LENGTH = 7
+MAX_CODE_ROUNDS = 10
+
+
+def _export_value(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+async def export_lines(rows: AsyncIterator, fmt: str) -> AsyncIterator[str]:
+    """Превращает поток строк таблицы в куски NDJSON или CSV по EXPORT_CHUNK_ROWS строк."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == "csv" else None
+    if writer:
+        writer.writerow(EXPORT_FIELDS)
+    count = 0
+    async for row in rows:
+        values = [_export_value(getattr(row, field)) for field in EXPORT_FIELDS]
+        if writer:
+            writer.writerow(values)
+        else:
+            buffer.write(json.dumps(dict(zip(EXPORT_FIELDS, values)), ensure_ascii=False) + "\n")
+        count += 1
+        if count % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+# --- Загрузка ---
+
+STAGING_COLUMNS = [
+    "line_no", "original_url", "short_code", "custom_alias",
+    "created_at", "expires_at", "access_count", "user_id",
+    "redirect_status", "cache_max_age",
+]
+
+
+def _generate_code() -> str:
+    return secrets.token_urlsafe(CODE_LENGTH)[:CODE_LENGTH]
+
+
+def _parse_datetime(value) -> Optional[datetime.datetime]:
+    if not value:
+        return None
+    parsed = datetime.datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed
+
+
+def _read_records(path: str, fmt: str) -> Iterator[dict]:
+    with open(path, encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _to_staging_record(line_no: int, record: dict, user_id: Optional[uuid.UUID]) -> tuple:
+    original_url = record.get("original_url") or ""
+    if not original_url.startswith(("http://", "https://")):
+        raise ValueError(f"line {line_no}: invalid original_url {original_url!r}")
+    if len(original_url) > MAX_URL_LENGTH:
+        raise ValueError(f"line {line_no}: original_url is longer than {MAX_URL_LENGTH} characters")
+    alias = record.get("custom_alias") or None
+    if alias is not None and not ALIAS_PATTERN.match(alias):
+        raise ValueError(f"line {line_no}: invalid custom_alias {alias!r}")
+    # Алиас всегда хранится и в short_code. Код без алиаса проверяется так же, как алиас:
+    # не-ASCII, длинные коды и коды с "/" не открываются редиректом и ломают edge-снимок.
+    # Отсутствующему или негодному коду сразу выделяется новый.
+    short_code = alias or record.get("short_code")
+    if not short_code or not ALIAS_PATTERN.match(short_code):
+        short_code = _generate_code()
+    record_user_id = user_id or (uuid.UUID(record["user_id"]) if record.get("user_id") else None)
+    redirect_status = int(record.get("redirect_status") or DEFAULT_REDIRECT_STATUS)
+    if redirect_status not in REDIRECT_STATUSES:
+        raise ValueError(f"line {line_no}: invalid redirect_status {redirect_status}")
+    cache_max_age = record.get("cache_max_age")
+    cache_max_age = int(cache_max_age) if cache_max_age not in (None, "") else None
+    if cache_max_age is not None and not MIN_CACHE_MAX_AGE <= cache_max_age <= MAX_CACHE_MAX_AGE:
+        raise ValueError(f"line {line_no}: invalid cache_max_age {cache_max_age}")
+    return (
+        line_no,
+        original_url,
+        short_code,
+        alias,
+        _parse_datetime(record.get("created_at")) or datetime.datetime.now(datetime.timezone.utc),
+        _parse_datetime(record.get("expires_at")),
+        int(record.get("access_count") or 0),
+        record_user_id,
+        redirect_status,
+        cache_max_age,
+    )
+
+
+async def _load_staging(
+    conn: asyncpg.Connection, path: str, fmt: str, user_id: Optional[uuid.UUID], chunk_size: int
+) -> int:
+    chunk: list[tuple] = []
+    loaded = 0
+    for line_no, record in enumerate(_read_records(path, fmt), start=1):
+        chunk.append(_to_staging_record(line_no, record, user_id))
+        if len(chunk) >= chunk_size:
+            await conn.copy_records_to_table("links_import", records=chunk, columns=STAGING_COLUMNS)
+            loaded += len(chunk)
+            chunk = []
+    if chunk:
+        await conn.copy_records_to_table("links_import", records=chunk, columns=STAGING_COLUMNS)
+        loaded += len(chunk)
+    return loaded
+
+
+async def _resolve_conflicts(conn: asyncpg.Connection, on_alias_conflict: str) -> int:
+    """Разрешает коды, занятые в links или повторяющиеся в файле. Возвращает число пропущенных строк."""
+    skipped = 0
+    for _ in range(MAX_CODE_ROUNDS):
+        # Конфликт: код уже есть в links или встречается в файле раньше
+        await conn.execute(
+            """
+            UPDATE links_import s SET needs_code = true
+            WHERE EXISTS (SELECT 1 FROM links l WHERE l.short_code = s.short_code)
+               OR EXISTS (
+                   SELECT 1 FROM links_import o
+                   WHERE o.short_code = s.short_code AND o.line_no < s.line_no
+               )
+            """
+        )
+        if on_alias_conflict == "skip":
+            result = await conn.execute(
+                "DELETE FROM links_import WHERE needs_code AND custom_alias IS NOT NULL"
+            )
+            skipped += int(result.split()[-1])
+        else:
+            await conn.execute(
+                "UPDATE links_import SET custom_alias = NULL WHERE needs_code AND custom_alias IS NOT NULL"
+            )
+
+        line_nos = [row["line_no"] for row in await conn.fetch(
+            "SELECT line_no FROM links_import WHERE needs_code"
+        )]
+        if not line_nos:
+            return skipped
+        # Новые коды выделяются пачкой одним UPDATE ... FROM unnest
+        await conn.execute(
+            """
+            UPDATE links_import s SET short_code = c.code, needs_code = false
+            FROM unnest($1::int[], $2::text[]) AS c(line_no, code)
+            WHERE s.line_no = c.line_no
+            """,
+            line_nos, [_generate_code() for _ in line_nos],
+        )
+    raise RuntimeError(f"Could not allocate unique codes in {MAX_CODE_ROUNDS} rounds")
+
+
+async def _drop_unknown_owners(conn: asyncpg.Connection) -> int:
+    """Обнуляет владельцев, которых нет в "user" (файл из другого окружения). Возвращает число строк."""
+    result = await conn.execute(
+        """
+        UPDATE links_import s SET user_id = NULL
+        WHERE s.user_id IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM "user" u WHERE u.id = s.user_id)
+        """
+    )
+    return int(result.split()[-1])
+
+
+async def import_links(
+    path: str,
+    fmt: str,
+    user_id: Optional[uuid.UUID] = None,
+    on_alias_conflict: str = "generate",
+    chunk_size: int = 10000,
+) -> dict:
+    if LINK_STORAGE_BACKEND != "postgres":
+        raise RuntimeError("Import uses COPY and is only available for LINK_STORAGE_BACKEND=postgres")
+    conn = await asyncpg.connect(
+        user=DB_USER, password=DB_PASS, host=DB_HOST, port=int(DB_PORT), database=DB_NAME
+    )
+    try:
+        if user_id is not None and not await conn.fetchval(
+            'SELECT EXISTS (SELECT 1 FROM "user" WHERE id = $1)', user_id
+        ):
+            raise ValueError(f"User {user_id} does not exist")
+        async with conn.transaction():
+            await conn.execute(
+                """
+                CREATE TEMP TABLE links_import (
+                    line_no integer PRIMARY KEY,
+                    original_url text NOT NULL,
+                    short_code text NOT NULL,
+                    custom_alias text,
+                    created_at timestamptz NOT NULL,
+                    expires_at timestamptz,
+                    access_count integer NOT NULL,
+                    user_id uuid,
+                    redirect_status integer NOT NULL,
+                    cache_max_age integer,
+                    needs_code boolean NOT NULL DEFAULT false
+                ) ON COMMIT DROP
+                """
+            )
+            loaded = await _load_staging(conn, path, fmt, user_id, chunk_size)
+            orphaned = await _drop_unknown_owners(conn)
+            await conn.execute("CREATE INDEX ON links_import (short_code)")
+            await conn.execute("ANALYZE links_import")
+            skipped = await _resolve_conflicts(conn, on_alias_conflict)
+            # ON CONFLICT страхует от кодов, вставленных параллельно после проверки
+            result = await conn.execute(
+                """
+                INSERT INTO links (
+                    original_url, short_code, custom_alias, created_at,
+                    expires_at, access_count, unique_visitors, user_id,
+                    redirect_status, cache_max_age
+                )
+                SELECT original_url, short_code, custom_alias, created_at,
+                       expires_at, access_count, 0, user_id,
+                       redirect_status, cache_max_age
+                FROM links_import
+                ORDER BY line_no
+                ON CONFLICT (short_code) DO NOTHING
+                """
+            )
+            inserted = int(result.split()[-1])
+    finally:
+        await conn.close()
+    return {
+        "loaded": loaded,
+        "inserted": inserted,
+        "skipped_alias_conflicts": skipped,
+        "owners_not_found": orphaned,
+        "lost_to_concurrent_inserts": loaded - skipped - inserted,
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    fmt = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+    stats = await import_links(
+        args.path, fmt, args.user_id, args.on_alias_conflict, args.chunk_size
+    )
+    print(
+        f"Loaded {stats['loaded']} rows, inserted {stats['inserted']}, "
+        f"skipped {stats['skipped_alias_conflicts']} alias conflicts, "
+        f"cleared {stats['owners_not_found']} unknown owners, "
+        f"lost {stats['lost_to_concurrent_inserts']} to concurrent inserts"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Массовая загрузка ссылок")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="Загрузить ссылки из NDJSON/CSV файла")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--format", choices=["ndjson", "csv"], default=None)
+    import_parser.add_argument("--user-id", type=uuid.UUID, default=None, help="Владелец всех загружаемых ссылок")
+    import_parser.add_argument(
+        "--on-alias-conflict", choices=["generate", "skip"], default="generate",
+        help="generate - выдать новый код вместо занятого алиаса, skip - пропустить строку",
+    )
+    import_parser.add_argument("--chunk-size", type=int, default=10000)
+    asyncio.run(main(parser.parse_args()))
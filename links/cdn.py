@@ -0,0 +1,78 @@
+"""Инвалидация закэшированных редиректов в CDN при изменении или удалении ссылки.
+
+Клиент выбирается через CDN_PURGE_BACKEND:
+- none - ничего не делает (по умолчанию);
+- local - запоминает URL в памяти, заменитель CDN для тестов и локального запуска;
+- http - POST {"files": [...]} на CDN_PURGE_URL с токеном CDN_PURGE_TOKEN.
+"""
+import abc
+import asyncio
+import json
+import urllib.request
+from typing import Optional
+
+from config import CDN_PURGE_BACKEND, CDN_PURGE_URL, CDN_PURGE_TOKEN, PUBLIC_BASE_URL
+
+
+class CDNPurgeClient(abc.ABC):
+    @abc.abstractmethod
+    async def purge(self, urls: list[str]) -> None:
+        """Удаляет указанные URL из кэша CDN."""
+
+
+class NoopCDNPurgeClient(CDNPurgeClient):
+    async def purge(self, urls: list[str]) -> None:
+        return None
+
+
+class LocalCDNPurgeClient(CDNPurgeClient):
+    def __init__(self):
+        self.purged: list[str] = []
+
+    async def purge(self, urls: list[str]) -> None:
+        self.purged.extend(urls)
+        print(f"CDN purge (local): {', '.join(urls)}")
+
+
+class HTTPCDNPurgeClient(CDNPurgeClient):
+    def __init__(self, endpoint: str, token: Optional[str] = None, timeout: float = 5.0):
+        self.endpoint = endpoint
+        self.token = token
+        self.timeout = timeout
+
+    def _post(self, urls: list[str]) -> None:
+        request = urllib.request.Request(
+            self.endpoint,
+            data=json.dumps({"files": urls}).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        if self.token:
+            request.add_header("Authorization", f"Bearer {self.token}")
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+    async def purge(self, urls: list[str]) -> None:
+        # urllib блокирующий, поэтому запрос уходит из отдельного потока
+        await asyncio.to_thread(self._post, urls)
+
+
+def _create_client() -> CDNPurgeClient:
+    if CDN_PURGE_BACKEND == "local":
+        return LocalCDNPurgeClient()
+    if CDN_PURGE_BACKEND == "http":
+        return HTTPCDNPurgeClient(CDN_PURGE_URL, CDN_PURGE_TOKEN)
+    if CDN_PURGE_BACKEND == "none":
+        return NoopCDNPurgeClient()
+    raise ValueError(f"Unknown CDN_PURGE_BACKEND: {CDN_PURGE_BACKEND}")
+
+
+cdn_client: CDNPurgeClient = _create_client()
+
+
+async def purge_link(short_code: str) -> None:
+    """Сбрасывает редирект ссылки в CDN. Ошибка CDN не должна ломать изменение ссылки."""
+    try:
+        await cdn_client.purge([f"{PUBLIC_BASE_URL}/{short_code}"])
+    except Exception as e:
+        print(f"Error purging CDN cache for {short_code}: {e}")
@@ -0,0 +1,194 @@
+import asyncio
+import hashlib
+
+import redis.asyncio as redis
+
+from config import (
+    HEAVY_HITTERS_WIDTH, HEAVY_HITTERS_DEPTH, HEAVY_HITTERS_TOP_K,
+    HEAVY_HITTERS_FLUSH_INTERVAL, HEAVY_HITTERS_WINDOW, REDIS_REDIRECT_HOT_TTL,
+)
+from redis_client import get_redis_connection, REDIS_REDIRECT_TTL
+
+REDIS_CMS_KEY = "hot:cms"
+REDIS_TOPK_KEY = "hot:topk"
+
+
+def _cell_indexes(code: str, width: int, depth: int) -> list[int]:
+    """Индексы ячеек Count-Min Sketch для кода (двойное хэширование).
+
+    Используется blake2b, а не hash(): индексы должны совпадать во всех воркерах,
+    иначе их скетчи нельзя будет сложить в Redis.
+    """
+    digest = hashlib.blake2b(code.encode("utf-8"), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:], "little") | 1
+    return [(h1 + row * h2) % width for row in range(depth)]
+
+
+class CountMinSketch:
+    """Count-Min Sketch: оценка частоты сверху при фиксированном объеме памяти."""
+
+    def __init__(self, width: int, depth: int):
+        self.width = width
+        self.depth = depth
+        self.rows = [[0] * width for _ in range(depth)]
+
+    def add(self, code: str, count: int = 1) -> None:
+        for row, col in enumerate(_cell_indexes(code, self.width, self.depth)):
+            self.rows[row][col] += count
+
+    def estimate(self, code: str) -> int:
+        return min(
+            self.rows[row][col]
+            for row, col in enumerate(_cell_indexes(code, self.width, self.depth))
+        )
+
+    def nonzero_cells(self) -> dict[str, int]:
+        """Ненулевые ячейки в виде {"строка:столбец": значение} для HINCRBY."""
+        return {
+            f"{row}:{col}": value
+            for row, values in enumerate(self.rows)
+            for col, value in enumerate(values)
+            if value
+        }
+
+
+class SpaceSaving:
+    """Top-K по алгоритму Space-Saving на структуре Stream-Summary.
+
+    Коды хранятся в корзинах по значению счетчика, поэтому и инкремент,
+    и вытеснение кода с минимальным счетчиком выполняются за O(1).
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts: dict[str, int] = {}
+        self.errors: dict[str, int] = {}
+        # Счетчик -> упорядоченное множество кодов с этим счетчиком
+        self.buckets: dict[int, dict[str, None]] = {}
+        self.min_count = 0
+
+    def _move(self, code: str, old: int, new: int) -> None:
+        bucket = self.buckets[old]
+        del bucket[code]
+        if not bucket:
+            del self.buckets[old]
+            if old == self.min_count:
+                self.min_count = new
+        self.counts[code] = new
+        self.buckets.setdefault(new, {})[code] = None
+
+    def add(self, code: str) -> None:
+        count = self.counts.get(code)
+        if count is not None:
+            self._move(code, count, count + 1)
+        elif len(self.counts) < self.capacity:
+            self.counts[code] = 1
+            self.errors[code] = 0
+            self.buckets.setdefault(1, {})[code] = None
+            self.min_count = 1
+        else:
+            # Вытесняем любой код с минимальным счетчиком, новый наследует его значение
+            count = self.min_count
+            bucket = self.buckets[count]
+            victim = next(iter(bucket))
+            del bucket[victim]
+            del self.counts[victim]
+            del self.errors[victim]
+            if not bucket:
+                del self.buckets[count]
+                self.min_count = count + 1
+            self.counts[code] = count + 1
+            self.errors[code] = count
+            self.buckets.setdefault(count + 1, {})[code] = None
+
+    def top(self, n: int) -> list[tuple[str, int]]:
+        return sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[:n]
+
+
+class HeavyHitterTracker:
+    """Локальный трекер горячих кодов воркера с периодическим слиянием через Redis.
+
+    В Redis хранится общий скетч (хэш `hot:cms`, ячейки складываются через HINCRBY)
+    и общий top-K (`hot:topk`, оценки пересчитываются по общему скетчу).
+    Оба ключа живут `HEAVY_HITTERS_WINDOW` секунд, после чего окно начинается заново.
+    """
+
+    def __init__(
+        self,
+        width: int = HEAVY_HITTERS_WIDTH,
+        depth: int = HEAVY_HITTERS_DEPTH,
+        top_k: int = HEAVY_HITTERS_TOP_K,
+    ):
+        self.width = width
+        self.depth = depth
+        self.top_k = top_k
+        self.sketch = CountMinSketch(width, depth)
+        self.top = SpaceSaving(top_k)
+        self.hot_codes: frozenset[str] = frozenset()
+
+    def record(self, code: str) -> None:
+        """Учитывает переход по коду. O(depth) для скетча и O(1) для top-K."""
+        self.sketch.add(code)
+        self.top.add(code)
+
+    def is_hot(self, code: str) -> bool:
+        return code in self.hot_codes
+
+    def cache_ttl(self, code: str) -> int:
+        """TTL записи в кэше редиректов: горячие коды закрепляются дольше."""
+        return REDIS_REDIRECT_HOT_TTL if code in self.hot_codes else REDIS_REDIRECT_TTL
+
+    async def flush(self, redis_conn: redis.Redis) -> None:
+        """Сливает локальные счетчики в общий скетч и обновляет общий top-K."""
+        sketch, top = self.sketch, self.top
+        self.sketch = CountMinSketch(self.width, self.depth)
+        self.top = SpaceSaving(self.top_k)
+
+        cells = sketch.nonzero_cells()
+        candidates = [code for code, _ in top.top(self.top_k)]
+        if cells:
+            pipe = redis_conn.pipeline(transaction=False)
+            for field, value in cells.items():
+                pipe.hincrby(REDIS_CMS_KEY, field, value)
+            pipe.expire(REDIS_CMS_KEY, HEAVY_HITTERS_WINDOW, nx=True)
+            await pipe.execute()
+
+        if candidates:
+            fields = [
+                f"{row}:{col}"
+                for code in candidates
+                for row, col in enumerate(_cell_indexes(code, self.width, self.depth))
+            ]
+            values = await redis_conn.hmget(REDIS_CMS_KEY, fields)
+            estimates = {}
+            for i, code in enumerate(candidates):
+                row_values = values[i * self.depth:(i + 1) * self.depth]
+                estimates[code] = min(int(value or 0) for value in row_values)
+
+            pipe = redis_conn.pipeline(transaction=False)
+            pipe.zadd(REDIS_TOPK_KEY, estimates)
+            pipe.zremrangebyrank(REDIS_TOPK_KEY, 0, -(self.top_k + 1))
+            pipe.expire(REDIS_TOPK_KEY, HEAVY_HITTERS_WINDOW, nx=True)
+            await pipe.execute()
+
+        self.hot_codes = frozenset(await redis_conn.zrange(REDIS_TOPK_KEY, 0, -1))
+
+    async def heavy_hitters(self, redis_conn: redis.Redis, limit: int) -> list[tuple[str, int]]:
+        """Текущие горячие коды по всем воркерам с оценкой числа переходов."""
+        entries = await redis_conn.zrevrange(REDIS_TOPK_KEY, 0, limit - 1, withscores=True)
+        return [(code, int(score)) for code, score in entries]
+
+
+tracker = HeavyHitterTracker()
+
+
+async def run_flush_loop(interval: int = HEAVY_HITTERS_FLUSH_INTERVAL) -> None:
+    """Фоновая задача: периодически сливает локальный трекер в Redis."""
+    redis_conn = await get_redis_connection()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await tracker.flush(redis_conn)
+        except Exception as e:
+            print(f"Error flushing heavy hitters: {e}")
@@ -0,0 +1,82 @@
+"""Политика HTTP-редиректа ссылки: код ответа и Cache-Control.
+
+Временные редиректы (302/307) кэшируются только при явном `cache_max_age`.
+Постоянные (301/308) без заголовка браузеры кэшируют эвристически, фактически навсегда,
+и инвалидация CDN при изменении ссылки до них уже не дойдет, поэтому для них max-age
+всегда явный: `cache_max_age` или PERMANENT_REDIRECT_MAX_AGE. В любом случае max-age
+не выходит за `expires_at`, чтобы истекшая ссылка не продолжала работать из кэша клиента.
+"""
+import datetime
+import json
+from typing import NamedTuple, Optional
+
+from config import PERMANENT_REDIRECT_MAX_AGE
+
+DEFAULT_REDIRECT_STATUS = 307
+PERMANENT_REDIRECT_STATUSES = (301, 308)
+REDIRECT_STATUSES = (301, 302, 307, 308)
+# Допустимый cache_max_age в секундах: от 0 (no-store) до года
+MIN_CACHE_MAX_AGE = 0
+MAX_CACHE_MAX_AGE = 31536000
+
+
+class CachedRedirect(NamedTuple):
+    url: str
+    status: int = DEFAULT_REDIRECT_STATUS
+    max_age: Optional[int] = None
+    expires_at: Optional[int] = None  # секунды Unix
+
+    def is_expired(self, now: float) -> bool:
+        return self.expires_at is not None and self.expires_at <= now
+
+
+def _to_epoch(value: Optional[datetime.datetime]) -> Optional[int]:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return int(value.timestamp())
+
+
+def encode_cache_entry(
+    url: str,
+    status: Optional[int],
+    max_age: Optional[int],
+    expires_at: Optional[datetime.datetime],
+) -> str:
+    """Значение ключа redirect:<code> в Redis."""
+    return json.dumps({
+        "url": url,
+        "status": status or DEFAULT_REDIRECT_STATUS,
+        "max_age": max_age,
+        "expires_at": _to_epoch(expires_at),
+    })
+
+
+def decode_cache_entry(value: str) -> CachedRedirect:
+    # Записи старого формата содержат только URL
+    if not value.startswith("{"):
+        return CachedRedirect(url=value)
+    data = json.loads(value)
+    return CachedRedirect(data["url"], data["status"], data["max_age"], data["expires_at"])
+
+
+def cache_ttl(entry: CachedRedirect, ttl: int, now: float) -> int:
+    """TTL ключа в Redis: не дольше, чем ссылка остается активной."""
+    if entry.expires_at is None:
+        return ttl
+    return max(min(ttl, int(entry.expires_at - now)), 1)
+
+
+def cache_control(entry: CachedRedirect, now: float) -> Optional[str]:
+    """Значение Cache-Control для редиректа или None, если заголовок не нужен."""
+    max_age = entry.max_age
+    if max_age is None and entry.status in PERMANENT_REDIRECT_STATUSES:
+        max_age = PERMANENT_REDIRECT_MAX_AGE
+    if max_age is not None and entry.expires_at is not None:
+        max_age = min(max_age, max(int(entry.expires_at - now), 0))
+    if max_age is None:
+        return None
+    if max_age == 0:
+        return "no-store"
+    return f"public, max-age={max_age}"
@@ -0,0 +1,385 @@
+"""Хранилище ссылок, независимое от конкретной базы данных.
+
+Реализации:
+- PostgresLinkRepository - основная, через async-движок из auth.database;
+- SQLiteLinkRepository - встроенная база (aiosqlite, WAL) для небольших edge-развертываний и бенчмарков;
+- InMemoryLinkRepository - словари в памяти процесса, без сети и без диска.
+
+Нужная выбирается через LINK_STORAGE_BACKEND в config.py.
+"""
+import abc
+import datetime
+import itertools
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, AsyncIterator, NamedTuple, Optional
+
+from sqlalchemy import event, exists, func, inspect, select, update, bindparam
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+
+from auth.database import async_session_maker
+from config import LINK_STORAGE_BACKEND, LINK_SQLITE_PATH
+from models.models import Link, LinkTombstone
+from .redirect_policy import DEFAULT_REDIRECT_STATUS
+
+
+class RedirectTarget(NamedTuple):
+    id: int
+    short_code: str
+    original_url: str
+    expires_at: Optional[datetime.datetime]
+    redirect_status: int
+    cache_max_age: Optional[int]
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+class LinkRepository(abc.ABC):
+    """Операции со ссылками, которые нужны роутерам и фоновым задачам."""
+
+    @abc.abstractmethod
+    async def code_exists(self, code: str) -> bool:
+        """Занят ли код (сгенерированный код и алиас живут в одном пространстве short_code)."""
+
+    @abc.abstractmethod
+    async def get_by_code(self, code: str) -> Optional[Link]:
+        """Ссылка по коду или алиасу, включая истекшие."""
+
+    @abc.abstractmethod
+    async def get_for_user(self, code: str, user_id: uuid.UUID) -> Optional[Link]:
+        """Ссылка по коду, только если она принадлежит пользователю."""
+
+    @abc.abstractmethod
+    async def get_redirect_target(self, code: str, active_only: bool = True) -> Optional[RedirectTarget]:
+        """Минимальный набор полей для редиректа."""
+
+    @abc.abstractmethod
+    async def get_active_by_codes(self, codes: list[str]) -> list[Link]:
+        """Все активные ссылки по списку кодов одним запросом."""
+
+    @abc.abstractmethod
+    async def find_by_original_url_for_user(self, original_url: str, user_id: uuid.UUID) -> list[Link]:
+        """Ссылки пользователя на указанный URL, новые первыми."""
+
+    @abc.abstractmethod
+    def stream_links(self, user_id: Optional[uuid.UUID] = None, batch_size: int = 1000) -> AsyncIterator:
+        """Построчно отдает ссылки (все или одного пользователя) с ограниченным расходом памяти."""
+
+    @abc.abstractmethod
+    async def record_access(self, link_id: int) -> None:
+        """Атомарно учитывает переход по ссылке."""
+
+    @abc.abstractmethod
+    async def update_unique_visitors(self, counts: dict[int, int]) -> None:
+        """Сохраняет оценки уникальных посетителей (id ссылки -> count)."""
+
+    @abc.abstractmethod
+    async def update(self, link: Link, changes: dict) -> Link:
+        """Меняет поля ссылки (оригинальный URL, политику редиректа) и обновляет updated_at."""
+
+    @abc.abstractmethod
+    async def add(self, link: Link) -> Link:
+        """Сохраняет новую ссылку и возвращает ее с заполненными id и created_at."""
+
+    @abc.abstractmethod
+    async def delete(self, link: Link) -> None:
+        """Удаляет ссылку и оставляет tombstone для дельт edge-снимков."""
+
+
+class SQLAlchemyLinkRepository(LinkRepository):
+    """Общая реализация поверх AsyncSession; диалект определяется движком сессии."""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    @staticmethod
+    def _active(statement):
+        return statement.where((Link.expires_at == None) | (Link.expires_at > _utcnow()))
+
+    async def code_exists(self, code: str) -> bool:
+        exists_query = select(exists().where(Link.short_code == code))
+        return bool((await self.session.execute(exists_query)).scalar())
+
+    async def get_by_code(self, code: str) -> Optional[Link]:
+        # Алиас всегда хранится и в short_code, поэтому достаточно одного уникального индекса
+        statement = select(Link).where(Link.short_code == code)
+        result = await self.session.execute(statement)
+        return result.scalar_one_or_none()
+
+    async def get_for_user(self, code: str, user_id: uuid.UUID) -> Optional[Link]:
+        statement = (
+            select(Link)
+            .where(Link.short_code == code)
+            .where(Link.user_id == user_id)
+        )
+        result = await self.session.execute(statement)
+        return result.scalar_one_or_none()
+
+    async def get_redirect_target(self, code: str, active_only: bool = True) -> Optional[RedirectTarget]:
+        # Только колонки из покрывающего индекса ix_links_short_code_redirect:
+        # в Postgres это дает index-only scan без чтения строки таблицы.
+        statement = select(
+            Link.id, Link.short_code, Link.original_url,
+            Link.expires_at, Link.redirect_status, Link.cache_max_age,
+        ).where(Link.short_code == code)
+        if active_only:
+            statement = self._active(statement)
+        row = (await self.session.execute(statement)).one_or_none()
+        return RedirectTarget(*row) if row else None
+
+    async def get_active_by_codes(self, codes: list[str]) -> list[Link]:
+        if not codes:
+            return []
+        statement = self._active(select(Link).where(Link.short_code.in_(codes)))
+        result = await self.session.execute(statement)
+        return list(result.scalars().all())
+
+    async def find_by_original_url_for_user(self, original_url: str, user_id: uuid.UUID) -> list[Link]:
+        statement = (
+            select(Link)
+            .where(Link.original_url == original_url)
+            .where(Link.user_id == user_id)
+            .order_by(Link.created_at.desc())
+        )
+        result = await self.session.execute(statement)
+        return list(result.scalars().all())
+
+    async def stream_links(self, user_id: Optional[uuid.UUID] = None, batch_size: int = 1000) -> AsyncIterator:
+        # Колонки, а не ORM-объекты: строки не попадают в identity map сессии,
+        # а yield_per включает серверный курсор, поэтому в памяти только одна порция.
+        statement = select(*Link.__table__.c).order_by(Link.id)
+        if user_id is not None:
+            statement = statement.where(Link.user_id == user_id)
+        result = await self.session.stream(statement.execution_options(yield_per=batch_size))
+        async for row in result:
+            yield row
+
+    async def record_access(self, link_id: int) -> None:
+        statement = (
+            update(Link)
+            .where(Link.id == link_id)
+            .values(access_count=Link.access_count + 1, last_accessed=_utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.execute(statement)
+        await self.session.commit()
+
+    async def update_unique_visitors(self, counts: dict[int, int]) -> None:
+        if not counts:
+            return
+        links_table = Link.__table__
+        statement = (
+            update(links_table)
+            .where(links_table.c.id == bindparam("b_id"))
+            .values(unique_visitors=bindparam("b_unique_visitors"))
+        )
+        await self.session.execute(
+            statement,
+            [{"b_id": link_id, "b_unique_visitors": count} for link_id, count in counts.items()]
+        )
+        await self.session.commit()
+
+    async def update(self, link: Link, changes: dict) -> Link:
+        for field, value in changes.items():
+            setattr(link, field, value)
+        # Время по часам БД: с ним сравнивается watermark снимка, взятый там же
+        link.updated_at = func.now()
+        self.session.add(link)
+        await self.session.commit()
+        await self.session.refresh(link)
+        return link
+
+    async def add(self, link: Link) -> Link:
+        self.session.add(link)
+        await self.session.commit()
+        await self.session.refresh(link)
+        return link
+
+    async def delete(self, link: Link) -> None:
+        self.session.add(LinkTombstone(short_code=link.short_code))
+        await self.session.delete(link)
+        await self.session.commit()
+
+
+class PostgresLinkRepository(SQLAlchemyLinkRepository):
+    """Ссылки в основной базе Postgres (сессии из auth.database)."""
+
+
+class SQLiteLinkRepository(SQLAlchemyLinkRepository):
+    """Ссылки во встроенной SQLite-базе LINK_SQLITE_PATH."""
+
+
+class InMemoryLinkRepository(LinkRepository):
+    """Ссылки в словаре процесса. Данные не переживают перезапуск и не общие для воркеров."""
+
+    def __init__(self):
+        self.links: dict[str, Link] = {}
+        self._by_id: dict[int, Link] = {}
+        self._ids = itertools.count(1)
+
+    @staticmethod
+    def _is_active(link: Link) -> bool:
+        return link.expires_at is None or link.expires_at > _utcnow()
+
+    async def code_exists(self, code: str) -> bool:
+        return code in self.links
+
+    async def get_by_code(self, code: str) -> Optional[Link]:
+        return self.links.get(code)
+
+    async def get_for_user(self, code: str, user_id: uuid.UUID) -> Optional[Link]:
+        link = self.links.get(code)
+        return link if link is not None and link.user_id == user_id else None
+
+    async def get_redirect_target(self, code: str, active_only: bool = True) -> Optional[RedirectTarget]:
+        link = self.links.get(code)
+        if link is None or (active_only and not self._is_active(link)):
+            return None
+        return RedirectTarget(
+            link.id, link.short_code, link.original_url,
+            link.expires_at, link.redirect_status, link.cache_max_age,
+        )
+
+    async def get_active_by_codes(self, codes: list[str]) -> list[Link]:
+        return [
+            link for link in (self.links.get(code) for code in codes)
+            if link is not None and self._is_active(link)
+        ]
+
+    async def find_by_original_url_for_user(self, original_url: str, user_id: uuid.UUID) -> list[Link]:
+        links = [
+            link for link in self.links.values()
+            if link.original_url == original_url and link.user_id == user_id
+        ]
+        return sorted(links, key=lambda link: link.created_at, reverse=True)
+
+    async def stream_links(self, user_id: Optional[uuid.UUID] = None, batch_size: int = 1000) -> AsyncIterator:
+        for link in list(self._by_id.values()):
+            if user_id is None or link.user_id == user_id:
+                yield link
+
+    async def record_access(self, link_id: int) -> None:
+        link = self._by_id.get(link_id)
+        if link is not None:
+            link.access_count += 1
+            link.last_accessed = _utcnow()
+
+    async def update_unique_visitors(self, counts: dict[int, int]) -> None:
+        for link_id, count in counts.items():
+            link = self._by_id.get(link_id)
+            if link is not None:
+                link.unique_visitors = count
+
+    async def update(self, link: Link, changes: dict) -> Link:
+        for field, value in changes.items():
+            setattr(link, field, value)
+        link.updated_at = _utcnow()
+        return link
+
+    async def add(self, link: Link) -> Link:
+        if link.short_code in self.links:
+            raise ValueError("Этот код уже используется.")
+        link.id = next(self._ids)
+        link.created_at = _utcnow()
+        link.access_count = 0
+        link.unique_visitors = 0
+        link.updated_at = link.created_at
+        if link.redirect_status is None:
+            link.redirect_status = DEFAULT_REDIRECT_STATUS
+        self.links[link.short_code] = link
+        self._by_id[link.id] = link
+        return link
+
+    async def delete(self, link: Link) -> None:
+        self.links.pop(link.short_code, None)
+        self._by_id.pop(link.id, None)
+
+
+def _create_sqlite_engine() -> AsyncEngine:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{LINK_SQLITE_PATH}")
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL: читатели не блокируются писателем; synchronous=NORMAL безопасен в WAL
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+    return engine
+
+
+def _upgrade_sqlite_schema(connection) -> None:
+    """Доводит существующую SQLite-базу до текущей модели Link.
+
+    Для встроенной базы миграций Alembic нет, а create_all не меняет существующие
+    таблицы: база, созданная старой версией, осталась бы без новых колонок.
+    Поэтому недостающие колонки добавляются через ALTER TABLE, а недостающие индексы
+    создаются. SQLite не разрешает в ADD COLUMN непостоянный DEFAULT (now()),
+    такие колонки добавляются без него - как и в Postgres-миграциях, где у старых
+    строк эти значения NULL.
+    """
+    existing = {column["name"] for column in inspect(connection).get_columns(Link.__tablename__)}
+    for column in Link.__table__.columns:
+        if column.name in existing:
+            continue
+        ddl = f"ALTER TABLE {Link.__tablename__} ADD COLUMN {column.name} {column.type.compile(dialect=connection.dialect)}"
+        default = column.server_default
+        if default is not None and isinstance(default.arg, str):
+            ddl += f" DEFAULT '{default.arg}'"
+            if not column.nullable:
+                ddl += " NOT NULL"
+        connection.exec_driver_sql(ddl)
+        print(f"Added column links.{column.name} to SQLite link storage")
+    for index in Link.__table__.indexes:
+        index.create(connection, checkfirst=True)
+
+
+_sqlite_engine: Optional[AsyncEngine] = None
+_sqlite_session_maker: Optional[async_sessionmaker] = None
+_memory_repository: Optional[InMemoryLinkRepository] = None
+
+
+async def init_link_storage() -> None:
+    """Готовит выбранное хранилище при старте приложения."""
+    global _sqlite_engine, _sqlite_session_maker, _memory_repository
+    print(f"Initializing link storage backend: {LINK_STORAGE_BACKEND}")
+    if LINK_STORAGE_BACKEND == "sqlite":
+        _sqlite_engine = _create_sqlite_engine()
+        _sqlite_session_maker = async_sessionmaker(_sqlite_engine, expire_on_commit=False)
+        # Для встроенной базы миграций Alembic нет: таблицы создаются и дополняются при старте
+        async with _sqlite_engine.begin() as conn:
+            await conn.run_sync(Link.metadata.create_all, tables=[Link.__table__, LinkTombstone.__table__])
+            await conn.run_sync(_upgrade_sqlite_schema)
+    elif LINK_STORAGE_BACKEND == "memory":
+        _memory_repository = InMemoryLinkRepository()
+    elif LINK_STORAGE_BACKEND != "postgres":
+        raise ValueError(f"Unknown LINK_STORAGE_BACKEND: {LINK_STORAGE_BACKEND}")
+
+
+async def close_link_storage() -> None:
+    global _sqlite_engine, _sqlite_session_maker
+    if _sqlite_engine is not None:
+        await _sqlite_engine.dispose()
+        _sqlite_engine = None
+        _sqlite_session_maker = None
+
+
+@asynccontextmanager
+async def open_link_repository() -> AsyncIterator[LinkRepository]:
+    """Репозиторий на время одной операции (запроса или прохода фоновой задачи)."""
+    if LINK_STORAGE_BACKEND == "memory":
+        yield _memory_repository
+    elif LINK_STORAGE_BACKEND == "sqlite":
+        async with _sqlite_session_maker() as session:
+            yield SQLiteLinkRepository(session)
+    else:
+        async with async_session_maker() as session:
+            yield PostgresLinkRepository(session)
+
+
+async def get_link_repository() -> AsyncGenerator[LinkRepository, None]:
+    async with open_link_repository() as repo:
+        yield repo
@@ -1,15 +1,23 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.responses import StreamingResponse
 import uuid
+import datetime
+import time
 from typing import Optional, List
 from pydantic import HttpUrl
 import redis.asyncio as redis
 
-from auth.database import get_async_session, User
+from auth.database import User
 from auth.auth import fastapi_users
 from . import crud
 from . import schemas
-from redis_client import get_redis_connection
+from . import visitors
+from . import redirect_policy
+from .cdn import purge_link
+from .bulk import export_lines
+from .repository import LinkRepository, get_link_repository, open_link_repository
+from .heavy_hitters import tracker as heavy_hitters_tracker
+from redis_client import get_redis_connection, REDIS_REDIRECT_KEY_PREFIX
 
 router = APIRouter(
     prefix="/links",
@@ -20,6 +28,8 @@ get_optional_current_user = fastapi_users.current_user(active=True, optional=Tru
 
 get_current_active_user = fastapi_users.current_user(active=True)
 
+get_current_superuser = fastapi_users.current_user(active=True, superuser=True)
+
 @router.post(
     "/shorten",
     response_model=schemas.LinkRead,
@@ -29,7 +39,7 @@ get_current_active_user = fastapi_users.current_user(active=True)
 )
 async def create_short_link(
     link_in: schemas.LinkCreate,
-    db: AsyncSession = Depends(get_async_session),
+    repo: LinkRepository = Depends(get_link_repository),
     user: Optional[User] = Depends(get_optional_current_user)
 ):
     """
@@ -41,7 +51,7 @@ async def create_short_link(
     - **Требуется аутентификация**: Нет (но если пользователь аутентифицирован, ссылка будет привязана к нему).
     """
     try:
-        created_link = await crud.create_link(db=db, link_data=link_in, user=user)
+        created_link = await crud.create_link(repo=repo, link_data=link_in, user=user)
         return created_link
     except ValueError as e:
         raise HTTPException(
@@ -64,7 +74,7 @@ async def create_short_link(
 async def search_links_by_original_url(
     # Используем Query для параметра запроса, делаем его обязательным
     original_url: HttpUrl = Query(..., description="Оригинальный URL для поиска"),
-    db: AsyncSession = Depends(get_async_session),
+    repo: LinkRepository = Depends(get_link_repository),
     user: User = Depends(get_current_active_user) # Требуем аутентификацию
 ):
     """
@@ -72,11 +82,126 @@ async def search_links_by_original_url(
     аутентифицированным пользователем для заданного `original_url`.
     """
     # Передаем строку в CRUD функцию
-    links = await crud.get_links_by_original_url_for_user(
-        db=db, original_url=str(original_url), user=user
+    links = await repo.find_by_original_url_for_user(
+        original_url=str(original_url), user_id=user.id
     )
     return links
 
+@router.get(
+    "/export",
+    summary="Выгрузить ссылки",
+    description="Потоково выгружает ссылки текущего пользователя (или все ссылки для суперпользователя) в NDJSON или CSV."
+)
+async def export_links(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Формат выгрузки: ndjson или csv"),
+    all_links: bool = Query(False, alias="all", description="Выгрузить ссылки всех пользователей (только суперпользователь)"),
+    user: User = Depends(get_current_active_user)
+):
+    """
+    Ссылки читаются из хранилища порциями (серверный курсор в Postgres),
+    поэтому расход памяти не зависит от числа ссылок.
+    Файл можно загрузить обратно командой `python -m links.bulk import`.
+    """
+    if all_links and not user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Выгрузка всех ссылок доступна только суперпользователю."
+        )
+    user_id = None if all_links else user.id
+
+    # Репозиторий открывается внутри генератора: зависимости FastAPI
+    # закрываются раньше, чем начинается отправка тела ответа.
+    async def body():
+        async with open_link_repository() as repo:
+            async for chunk in export_lines(repo.stream_links(user_id=user_id), format):
+                yield chunk
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="links.{format}"'}
+    )
+
+@router.post(
+    "/resolve",
+    response_model=schemas.LinkResolveResponse,
+    summary="Пакетное разрешение коротких ссылок",
+    description="Возвращает оригинальные URL для списка коротких кодов или алиасов. Не учитывается как переход по ссылке."
+)
+async def resolve_links(
+    resolve_in: schemas.LinkResolveRequest,
+    repo: LinkRepository = Depends(get_link_repository),
+    redis_conn: redis.Redis = Depends(get_redis_connection)
+):
+    """
+    Разрешает список коротких кодов за один проход:
+    - один `MGET` в Redis для всех кодов;
+    - один запрос в БД для промахов кэша;
+    - найденные в БД ссылки дописываются в кэш через pipeline.
+
+    Статистика переходов (`access_count`) не изменяется.
+    """
+    # Убираем дубликаты, сохраняя порядок
+    codes = list(dict.fromkeys(resolve_in.codes))
+    redis_keys = [f"{REDIS_REDIRECT_KEY_PREFIX}{code}" for code in codes]
+    cached_values = await redis_conn.mget(redis_keys)
+    now = time.time()
+
+    resolved: dict[str, str] = {}
+    for code, value in zip(codes, cached_values):
+        if not value:
+            continue
+        entry = redirect_policy.decode_cache_entry(value)
+        # Истекшая ссылка в кэше - промах: БД вернет только активные ссылки
+        if not entry.is_expired(now):
+            resolved[code] = entry.url
+    misses = [code for code in codes if code not in resolved]
+
+    if misses:
+        links = await repo.get_active_by_codes(misses)
+        pipe = redis_conn.pipeline(transaction=False)
+        for link in links:
+            original_url = str(link.original_url)
+            resolved[link.short_code] = original_url
+            cached_value = redirect_policy.encode_cache_entry(
+                original_url, link.redirect_status, link.cache_max_age, link.expires_at
+            )
+            cache_ttl = redirect_policy.cache_ttl(
+                redirect_policy.decode_cache_entry(cached_value),
+                heavy_hitters_tracker.cache_ttl(link.short_code), now
+            )
+            pipe.set(f"{REDIS_REDIRECT_KEY_PREFIX}{link.short_code}", cached_value, ex=cache_ttl)
+        await pipe.execute()
+
+    return schemas.LinkResolveResponse(
+        results=[
+            schemas.ResolvedLink(code=code, original_url=resolved.get(code), found=code in resolved)
+            for code in codes
+        ]
+    )
+
+@router.get(
+    "/admin/heavy-hitters",
+    response_model=List[schemas.HeavyHitter],
+    summary="Горячие короткие ссылки",
+    description="Возвращает самые популярные короткие коды за текущее окно по всем воркерам. Только для суперпользователей."
+)
+async def list_heavy_hitters(
+    limit: int = Query(20, ge=1, le=1000, description="Сколько кодов вернуть"),
+    user: User = Depends(get_current_superuser),
+    redis_conn: redis.Redis = Depends(get_redis_connection)
+):
+    """
+    Оценки получены из общего Count-Min Sketch в Redis, поэтому
+    могут быть немного завышены, но не занижены.
+    """
+    entries = await heavy_hitters_tracker.heavy_hitters(redis_conn, limit)
+    return [
+        schemas.HeavyHitter(code=code, estimated_count=count)
+        for code, count in entries
+    ]
+
 @router.get(
     "/{short_code}/stats",
     response_model=schemas.LinkStats,
@@ -85,7 +210,10 @@ async def search_links_by_original_url(
 )
 async def get_link_stats(
     short_code: str,
-    db: AsyncSession = Depends(get_async_session)
+    date_from: Optional[datetime.date] = Query(None, description="Начало периода для уникальных посетителей (UTC)"),
+    date_to: Optional[datetime.date] = Query(None, description="Конец периода для уникальных посетителей (UTC, включительно)"),
+    repo: LinkRepository = Depends(get_link_repository),
+    redis_conn: redis.Redis = Depends(get_redis_connection)
 ):
     """
     Возвращает статистику для ссылки:
@@ -93,39 +221,64 @@ async def get_link_stats(
     - дата создания
     - дата последнего доступа
     - количество переходов
+    - оценка числа уникальных посетителей (HyperLogLog)
+    - оценка уникальных посетителей за период, если указан `date_from` и/или `date_to`
     
     Доступно всем пользователям.
     """
-    link = await crud.get_any_link_by_code_or_alias(db, short_code)
+    link = await repo.get_by_code(short_code)
     
     if link is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Ссылка не найдена."
         )
-        
-    return link
+
+    stats = schemas.LinkStats.model_validate(link)
+    # Если HLL в Redis пропал, отдаем последнюю сохраненную в БД оценку
+    live_count = await visitors.count_unique_visitors(redis_conn, link.id)
+    stats.unique_visitors = live_count or link.unique_visitors or 0
+
+    if date_from is not None or date_to is not None:
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        date_to = date_to or today
+        date_from = date_from or date_to
+        if date_from > date_to:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="date_from не может быть позже date_to."
+            )
+        if (date_to - date_from).days >= visitors.UNIQUE_VISITORS_DAILY_TTL_DAYS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Период не может превышать {visitors.UNIQUE_VISITORS_DAILY_TTL_DAYS} дней."
+            )
+        stats.unique_visitors_in_range = await visitors.count_unique_visitors_in_range(
+            redis_conn, link.id, date_from, date_to
+        )
+
+    return stats
 
 @router.put(
     "/{short_code}",
     response_model=schemas.LinkRead,
-    summary="Обновить оригинальный URL ссылки",
-    description="Обновляет оригинальный URL для существующей короткой ссылки, если она принадлежит текущему пользователю."
+    summary="Обновить ссылку",
+    description="Обновляет оригинальный URL и/или политику редиректа существующей короткой ссылки, если она принадлежит текущему пользователю."
 )
 async def update_link(
     short_code: str,
     link_update_data: schemas.LinkUpdate,
-    db: AsyncSession = Depends(get_async_session),
+    repo: LinkRepository = Depends(get_link_repository),
     user: User = Depends(get_current_active_user),
     redis_conn: redis.Redis = Depends(get_redis_connection)
 ):
     """
-    Обновляет оригинальный URL существующей короткой ссылки.
-    Инвалидирует кэш Redis для этой ссылки.
+    Обновляет переданные поля ссылки: оригинальный URL, код редиректа, max-age.
+    Инвалидирует кэш Redis и CDN для этой ссылки.
+    Браузеры, уже закэшировавшие редирект, увидят изменения только после истечения max-age
+    (для 301/308 он всегда явный, по умолчанию PERMANENT_REDIRECT_MAX_AGE).
     """
-    link_to_update = await crud.get_link_by_short_code_for_user(
-        db=db, short_code=short_code, user=user
-    )
+    link_to_update = await repo.get_for_user(short_code, user.id)
 
     if link_to_update is None:
         raise HTTPException(
@@ -143,11 +296,16 @@ async def update_link(
     print(f"Invalidated Redis cache for keys: {redis_key}, {alias_redis_key if alias_redis_key else ''}")
     # -------------------------
     
-    updated_link = await crud.update_link_original_url(
-        db=db, 
-        link_to_update=link_to_update, 
-        new_original_url=str(link_update_data.original_url)
-    )
+    changes = link_update_data.model_dump(exclude_unset=True)
+    # null сбрасывает только cache_max_age; для остальных полей означает "не менять"
+    for field in ("original_url", "redirect_status"):
+        if field in changes and changes[field] is None:
+            changes.pop(field)
+    if "original_url" in changes:
+        changes["original_url"] = str(changes["original_url"])
+
+    updated_link = await repo.update(link_to_update, changes)
+    await purge_link(updated_link.short_code)
     
     return updated_link
 
@@ -159,17 +317,15 @@ async def update_link(
 )
 async def delete_short_link(
     short_code: str,
-    db: AsyncSession = Depends(get_async_session),
+    repo: LinkRepository = Depends(get_link_repository),
     user: User = Depends(get_current_active_user),
     redis_conn: redis.Redis = Depends(get_redis_connection)
 ):
     """
     Удаляет связь короткой ссылки с оригинальным URL.
-    Инвалидирует кэш Redis для этой ссылки.
+    Инвалидирует кэш Redis и CDN для этой ссылки.
     """
-    link_to_delete = await crud.get_link_by_short_code_for_user(
-        db=db, short_code=short_code, user=user
-    )
+    link_to_delete = await repo.get_for_user(short_code, user.id)
 
     if link_to_delete is None:
         raise HTTPException(
@@ -187,5 +343,8 @@ async def delete_short_link(
     print(f"Invalidated Redis cache for keys: {redis_key}, {alias_redis_key if alias_redis_key else ''}")
     # ------------------------------------------------
 
-    await crud.delete_link(db=db, link_to_delete=link_to_delete)
+    link_id = link_to_delete.id
+    await repo.delete(link_to_delete)
+    await visitors.forget_link(redis_conn, link_id)
+    await purge_link(link_to_delete.short_code)
     return None
\ No newline at end of file
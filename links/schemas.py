@@ -1,7 +1,9 @@
 from pydantic import BaseModel, HttpUrl, Field, ConfigDict
 import datetime
 import uuid
-from typing import Optional
+from typing import Optional, List, Literal
+
+from .redirect_policy import MIN_CACHE_MAX_AGE, MAX_CACHE_MAX_AGE
 
 class LinkCreate(BaseModel):
     original_url: HttpUrl
@@ -17,6 +19,16 @@ class LinkCreate(BaseModel):
         default=None,
         description="Опциональная дата и время истечения срока действия ссылки (UTC)"
     )
+    redirect_status: Literal[301, 302, 307, 308] = Field(
+        default=307,
+        description="HTTP-код редиректа: 301/308 - постоянный (кэшируется браузерами), 302/307 - временный"
+    )
+    cache_max_age: Optional[int] = Field(
+        default=None,
+        ge=MIN_CACHE_MAX_AGE,
+        le=MAX_CACHE_MAX_AGE,
+        description="Cache-Control max-age редиректа в секундах (не больше времени до expires_at)"
+    )
 
 class LinkRead(BaseModel):
     original_url: HttpUrl
@@ -24,6 +36,8 @@ class LinkRead(BaseModel):
     custom_alias: Optional[str] = None
     created_at: datetime.datetime
     expires_at: Optional[datetime.datetime] = None
+    redirect_status: int = 307
+    cache_max_age: Optional[int] = None
     model_config = ConfigDict(from_attributes=True)
 
 class LinkStats(BaseModel):
@@ -31,8 +45,35 @@ class LinkStats(BaseModel):
     created_at: datetime.datetime
     last_accessed: Optional[datetime.datetime] = None
     access_count: int
+    unique_visitors: int = 0
+    unique_visitors_in_range: Optional[int] = Field(
+        default=None,
+        description="Оценка уникальных посетителей за период date_from..date_to (если он задан)"
+    )
 
     model_config = ConfigDict(from_attributes=True)
 
 class LinkUpdate(BaseModel):
-    original_url: HttpUrl
\ No newline at end of file
+    original_url: Optional[HttpUrl] = None
+    redirect_status: Optional[Literal[301, 302, 307, 308]] = None
+    cache_max_age: Optional[int] = Field(default=None, ge=MIN_CACHE_MAX_AGE, le=MAX_CACHE_MAX_AGE)
+
+class LinkResolveRequest(BaseModel):
+    codes: List[str] = Field(
+        ...,
+        min_length=1,
+        max_length=1000,
+        description="Список коротких кодов или алиасов для разрешения (не более 1000)"
+    )
+
+class ResolvedLink(BaseModel):
+    code: str
+    original_url: Optional[str] = None
+    found: bool
+
+class LinkResolveResponse(BaseModel):
+    results: List[ResolvedLink]
+
+class HeavyHitter(BaseModel):
+    code: str
+    estimated_count: int
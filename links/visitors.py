@@ -0,0 +1,119 @@
+import asyncio
+import datetime
+import hashlib
+
+import redis.asyncio as redis
+from fastapi import Request
+
+from config import UNIQUE_VISITORS_DAILY_TTL_DAYS, UNIQUE_VISITORS_PERSIST_INTERVAL
+from redis_client import get_redis_connection
+from .repository import open_link_repository
+
+# Ключи строятся по id ссылки, а не по коду: освобожденный алиас может достаться
+# новой ссылке, и она не должна унаследовать посетителей старой
+REDIS_VISITORS_KEY_PREFIX = "uv:link:"
+REDIS_VISITORS_DIRTY_KEY = "uv:dirty:ids"
+REDIS_VISITORS_RANGE_TTL = 60
+PERSIST_BATCH_SIZE = 500
+
+
+def _total_key(link_id: int) -> str:
+    return f"{REDIS_VISITORS_KEY_PREFIX}{link_id}"
+
+
+def _daily_key(link_id: int, day: datetime.date) -> str:
+    return f"{REDIS_VISITORS_KEY_PREFIX}{link_id}:{day.isoformat()}"
+
+
+def get_visitor_id(request: Request) -> str:
+    """Идентификатор посетителя: хэш IP-адреса и User-Agent (сами данные не храним)."""
+    host = request.client.host if request.client else ""
+    user_agent = request.headers.get("user-agent", "")
+    return hashlib.sha1(f"{host}|{user_agent}".encode("utf-8")).hexdigest()[:16]
+
+
+async def record_visit(redis_conn: redis.Redis, link_id: int, visitor_id: str) -> None:
+    """Добавляет посетителя в общий и дневной HyperLogLog ссылки (~12KB на ключ)."""
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    daily_key = _daily_key(link_id, today)
+    pipe = redis_conn.pipeline(transaction=False)
+    pipe.pfadd(_total_key(link_id), visitor_id)
+    pipe.pfadd(daily_key, visitor_id)
+    pipe.expire(daily_key, UNIQUE_VISITORS_DAILY_TTL_DAYS * 86400, nx=True)
+    pipe.sadd(REDIS_VISITORS_DIRTY_KEY, link_id)
+    await pipe.execute()
+
+
+async def count_unique_visitors(redis_conn: redis.Redis, link_id: int) -> int:
+    return await redis_conn.pfcount(_total_key(link_id))
+
+
+async def count_unique_visitors_in_range(
+    redis_conn: redis.Redis,
+    link_id: int,
+    date_from: datetime.date,
+    date_to: datetime.date,
+) -> int:
+    """Оценка уникальных посетителей за период: дневные HLL объединяются через PFMERGE.
+
+    Результат объединения сохраняется на `REDIS_VISITORS_RANGE_TTL` секунд,
+    чтобы повторные запросы того же периода не пересобирали его; посетители
+    за сегодня попадают в оценку с задержкой не больше этого TTL.
+    """
+    days = (date_to - date_from).days + 1
+    daily_keys = [
+        _daily_key(link_id, date_from + datetime.timedelta(days=i))
+        for i in range(days)
+    ]
+    range_key = f"{REDIS_VISITORS_KEY_PREFIX}{link_id}:range:{date_from.isoformat()}:{date_to.isoformat()}"
+    # PFMERGE учитывает и сам ключ назначения, поэтому повторный merge ничего
+    # не дает; пересобираем только когда ключа нет (истек TTL)
+    if not await redis_conn.exists(range_key):
+        pipe = redis_conn.pipeline(transaction=False)
+        pipe.pfmerge(range_key, *daily_keys)
+        pipe.expire(range_key, REDIS_VISITORS_RANGE_TTL)
+        await pipe.execute()
+    return await redis_conn.pfcount(range_key)
+
+
+async def persist_unique_visitors(redis_conn: redis.Redis) -> int:
+    """Сохраняет оценки по ссылкам, у которых были переходы, в хранилище ссылок."""
+    persisted = 0
+    while True:
+        members = await redis_conn.spop(REDIS_VISITORS_DIRTY_KEY, PERSIST_BATCH_SIZE)
+        if not members:
+            return persisted
+        link_ids = [int(member) for member in members]
+        pipe = redis_conn.pipeline(transaction=False)
+        for link_id in link_ids:
+            pipe.pfcount(_total_key(link_id))
+        counts = dict(zip(link_ids, await pipe.execute()))
+        try:
+            async with open_link_repository() as repo:
+                await repo.update_unique_visitors(counts)
+        except Exception:
+            # Возвращаем ссылки в очередь, чтобы не потерять их до следующего прохода
+            await redis_conn.sadd(REDIS_VISITORS_DIRTY_KEY, *link_ids)
+            raise
+        persisted += len(counts)
+
+
+async def forget_link(redis_conn: redis.Redis, link_id: int) -> None:
+    """Удаляет общий HLL удаленной ссылки; дневные ключи истекут сами."""
+    pipe = redis_conn.pipeline(transaction=False)
+    pipe.delete(_total_key(link_id))
+    pipe.srem(REDIS_VISITORS_DIRTY_KEY, link_id)
+    await pipe.execute()
+
+
+async def run_persist_loop(interval: int = UNIQUE_VISITORS_PERSIST_INTERVAL) -> None:
+    """Фоновая задача: периодически переносит оценки из Redis в хранилище ссылок."""
+    redis_conn = await get_redis_connection()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            persisted = await persist_unique_visitors(redis_conn)
+            if persisted:
+                print(f"Persisted unique visitor counts for {persisted} links")
+        except Exception as e:
+            print(f"Error persisting unique visitors: {e}")
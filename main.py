@@ -1,24 +1,43 @@
+import asyncio
+import time
 import uvicorn
 from contextlib import asynccontextmanager
 
-from fastapi import Depends, FastAPI, HTTPException, status
+from fastapi import Depends, FastAPI, HTTPException, Request, status
 from fastapi.responses import RedirectResponse
-from sqlalchemy.ext.asyncio import AsyncSession
 import redis.asyncio as redis
-from redis_client import get_redis_connection, close_redis_pool, get_redis_pool
+from redis_client import (
+    get_redis_connection, close_redis_pool, get_redis_pool,
+    REDIS_REDIRECT_KEY_PREFIX,
+)
 
-from auth.database import User, get_async_session
 from auth.schemas import UserCreate, UserRead
 from auth.auth import auth_backend, fastapi_users
+from auth.password import password_helper
+from auth.router import router as auth_router
 from links.router import router as links_router
-from links import crud as links_crud
+from links.repository import (
+    LinkRepository, get_link_repository, init_link_storage, close_link_storage,
+)
+from links import heavy_hitters
+from links import visitors
+from links import redirect_policy
+from config import PROFILING_ENABLED
+import profiling
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("Application startup: Initializing resources...")
     _ = get_redis_pool() 
+    await init_link_storage()
+    heavy_hitters_task = asyncio.create_task(heavy_hitters.run_flush_loop())
+    visitors_task = asyncio.create_task(visitors.run_persist_loop())
     yield
     print("Application shutdown: Cleaning up resources...")
+    heavy_hitters_task.cancel()
+    visitors_task.cancel()
+    password_helper.shutdown()
+    await close_link_storage()
     await close_redis_pool()
 
 app = FastAPI(
@@ -28,51 +47,64 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-REDIS_REDIRECT_KEY_PREFIX = "redirect:"
-REDIS_REDIRECT_TTL = 3600 
+if PROFILING_ENABLED:
+    profiling.install()
+    app.add_middleware(profiling.ProfilingMiddleware)
 
 @app.get(
     "/{short_code}", 
     status_code=status.HTTP_307_TEMPORARY_REDIRECT,
     tags=["Redirect"],
     summary="Перенаправление по короткой ссылке (с кэшированием)",
-    description="Находит оригинальный URL по короткому коду или алиасу (сначала в Redis, потом в БД) и перенаправляет пользователя."
+    description="Находит оригинальный URL по короткому коду или алиасу (сначала в Redis, потом в БД) и перенаправляет пользователя. Код ответа и Cache-Control задаются политикой редиректа ссылки."
 )
 async def redirect_to_original_url(
     short_code: str,
-    db: AsyncSession = Depends(get_async_session),
+    request: Request,
+    repo: LinkRepository = Depends(get_link_repository),
     redis_conn: redis.Redis = Depends(get_redis_connection) 
 ):
     redis_key = f"{REDIS_REDIRECT_KEY_PREFIX}{short_code}"
-    cached_url = await redis_conn.get(redis_key)
-    original_url: str | None = None
-    link_from_db: links_crud.Link | None = None 
+    cached_value = await redis_conn.get(redis_key)
+    now = time.time()
+    entry: redirect_policy.CachedRedirect | None = None
+    target = None
 
-    if cached_url:
+    if cached_value:
         print(f"Cache hit for {short_code}")
-        original_url = cached_url
-        link_from_db = await links_crud.get_any_link_by_code_or_alias(db, short_code)
-        if link_from_db:
-             await links_crud.update_link_stats(db, link_from_db)
-             await db.commit()
-        else:
+        entry = redirect_policy.decode_cache_entry(cached_value)
+        target = await repo.get_redirect_target(short_code, active_only=False)
+        if target is None or entry.is_expired(now):
              await redis_conn.delete(redis_key)
              raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ссылка не найдена.")
+        heavy_hitters.tracker.record(target.short_code)
+        await repo.record_access(target.id)
     else:
         print(f"Cache miss for {short_code}")
-        link_from_db = await links_crud.get_active_link_by_code_or_alias(db, short_code)
-        if link_from_db is None:
+        target = await repo.get_redirect_target(short_code)
+        if target is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, 
                 detail="Ссылка не найдена или срок ее действия истек."
             )
-        original_url = str(link_from_db.original_url)
-        await redis_conn.set(redis_key, original_url, ex=REDIS_REDIRECT_TTL)
-        print(f"Cached {short_code} -> {original_url} for {REDIS_REDIRECT_TTL}s")
-        await links_crud.update_link_stats(db, link_from_db)
-        await db.commit()
+        # Учитываем только существующие ссылки: промахи сканеров не должны вытеснять горячие коды
+        heavy_hitters.tracker.record(target.short_code)
+        original_url = str(target.original_url)
+        cached_value = redirect_policy.encode_cache_entry(
+            original_url, target.redirect_status, target.cache_max_age, target.expires_at
+        )
+        entry = redirect_policy.decode_cache_entry(cached_value)
+        cache_ttl = redirect_policy.cache_ttl(entry, heavy_hitters.tracker.cache_ttl(target.short_code), now)
+        await redis_conn.set(redis_key, cached_value, ex=cache_ttl)
+        print(f"Cached {short_code} -> {original_url} for {cache_ttl}s")
+        await repo.record_access(target.id)
 
-    return RedirectResponse(url=original_url)
+    await visitors.record_visit(redis_conn, target.id, visitors.get_visitor_id(request))
+    response = RedirectResponse(url=entry.url, status_code=entry.status)
+    cache_control = redirect_policy.cache_control(entry, now)
+    if cache_control:
+        response.headers["Cache-Control"] = cache_control
+    return response
 
 app.include_router(
     fastapi_users.get_auth_router(auth_backend), prefix="/auth/jwt", tags=["Auth"]
@@ -82,6 +114,7 @@ app.include_router(
     prefix="/auth",
     tags=["Auth"],
 )
+app.include_router(auth_router)
 app.include_router(links_router)
 
 if __name__ == "__main__":
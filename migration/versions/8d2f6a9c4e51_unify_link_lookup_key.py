@@ -0,0 +1,81 @@
+"""Unify link lookup key into short_code with a covering index
+
+Revision ID: 8d2f6a9c4e51
+Revises: 3b9e4c1d7a20
+Create Date: 2026-10-18 13:02:41.907316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2f6a9c4e51'
+down_revision: Union[str, None] = '3b9e4c1d7a20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 5000
+
+
+def upgrade() -> None:
+    # Все шаги выполняются вне общей транзакции: бэкфилл коммитится пачками,
+    # а индексы строятся CONCURRENTLY, чтобы не блокировать запись в links.
+    with op.get_context().autocommit_block():
+        # Бэкфилл: у каждой ссылки с алиасом short_code должен совпадать с алиасом.
+        # Строки, где алиас уже занят чужим short_code, пропускаем и после бэкфилла
+        # останавливаем миграцию: без индекса по custom_alias такие алиасы перестанут открываться.
+        while True:
+            result = op.get_bind().execute(sa.text(
+                """
+                UPDATE links SET short_code = custom_alias
+                WHERE id IN (
+                    SELECT l.id FROM links l
+                    WHERE l.custom_alias IS NOT NULL
+                      AND l.short_code <> l.custom_alias
+                      AND NOT EXISTS (
+                          SELECT 1 FROM links o WHERE o.short_code = l.custom_alias
+                      )
+                    LIMIT :batch_size
+                )
+                """
+            ), {"batch_size": BACKFILL_BATCH_SIZE})
+            if result.rowcount == 0:
+                break
+        conflicts = op.get_bind().execute(sa.text(
+            "SELECT id, custom_alias FROM links "
+            "WHERE custom_alias IS NOT NULL AND short_code <> custom_alias"
+        )).fetchall()
+        if conflicts:
+            details = ", ".join(f"{link_id} ({alias})" for link_id, alias in conflicts)
+            # Бэкфилл уже закоммичен пачками и идемпотентен: после ручного разрешения
+            # конфликтов (смена алиаса или удаление ссылки) миграцию можно запустить снова.
+            raise RuntimeError(
+                f"Aliases of {len(conflicts)} links clash with another link's short_code, "
+                f"resolve them and rerun the migration. Link ids (alias): {details}"
+            )
+
+        # original_url ограничен 2083 символами (HttpUrl), поэтому строка индекса
+        # с INCLUDE укладывается в лимит размера B-tree.
+        op.create_index(
+            'ix_links_short_code_lookup', 'links', ['short_code'], unique=True,
+            postgresql_include=['id', 'original_url', 'expires_at'],
+            postgresql_concurrently=True,
+        )
+        op.drop_index('ix_links_short_code', table_name='links', postgresql_concurrently=True)
+        op.drop_index('ix_links_custom_alias', table_name='links', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_links_custom_alias', 'links', ['custom_alias'], unique=True,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_links_short_code', 'links', ['short_code'], unique=True,
+            postgresql_concurrently=True,
+        )
+        op.drop_index('ix_links_short_code_lookup', table_name='links', postgresql_concurrently=True)
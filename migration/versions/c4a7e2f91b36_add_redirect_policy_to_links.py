@@ -0,0 +1,44 @@
+"""Add redirect policy to links
+
+Revision ID: c4a7e2f91b36
+Revises: 8d2f6a9c4e51
+Create Date: 2026-10-18 16:21:07.553190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a7e2f91b36'
+down_revision: Union[str, None] = '8d2f6a9c4e51'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('links', sa.Column('redirect_status', sa.Integer(), server_default='307', nullable=False))
+    op.add_column('links', sa.Column('cache_max_age', sa.Integer(), nullable=True))
+    # Покрывающий индекс пересобирается с новыми колонками, чтобы редирект
+    # по-прежнему обходился index-only scan
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_links_short_code_redirect', 'links', ['short_code'], unique=True,
+            postgresql_include=['id', 'original_url', 'expires_at', 'redirect_status', 'cache_max_age'],
+            postgresql_concurrently=True,
+        )
+        op.drop_index('ix_links_short_code_lookup', table_name='links', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_links_short_code_lookup', 'links', ['short_code'], unique=True,
+            postgresql_include=['id', 'original_url', 'expires_at'],
+            postgresql_concurrently=True,
+        )
+        op.drop_index('ix_links_short_code_redirect', table_name='links', postgresql_concurrently=True)
+    op.drop_column('links', 'cache_max_age')
+    op.drop_column('links', 'redirect_status')
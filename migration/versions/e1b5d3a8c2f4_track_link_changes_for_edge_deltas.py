@@ -0,0 +1,46 @@
+"""Track link changes and deletions for edge deltas
+
+Revision ID: e1b5d3a8c2f4
+Revises: c4a7e2f91b36
+Create Date: 2026-10-19 10:14:52.208731
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1b5d3a8c2f4'
+down_revision: Union[str, None] = 'c4a7e2f91b36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Колонка добавляется без значения для существующих строк (без перезаписи таблицы),
+    # default now() действует только для новых ссылок
+    op.add_column('links', sa.Column('updated_at', sa.TIMESTAMP(timezone=True), nullable=True))
+    op.alter_column('links', 'updated_at', server_default=sa.text('now()'))
+    op.create_table(
+        'link_tombstones',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('short_code', sa.String(), nullable=False),
+        sa.Column('deleted_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_link_tombstones_deleted_at', 'link_tombstones', ['deleted_at'])
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_links_updated_at', 'links', ['updated_at'],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_links_updated_at', table_name='links', postgresql_concurrently=True)
+    op.drop_index('ix_link_tombstones_deleted_at', table_name='link_tombstones')
+    op.drop_table('link_tombstones')
+    op.drop_column('links', 'updated_at')
@@ -1,7 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, TIMESTAMP
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, TIMESTAMP, Index, Uuid, func
 from sqlalchemy.orm import relationship, declarative_base
 
 Base = declarative_base()
@@ -9,14 +8,40 @@ Base = declarative_base()
 
 class Link(Base):
     __tablename__ = "links"
+    __table_args__ = (
+        # Единое пространство кодов: алиас хранится в short_code, поэтому редирект
+        # делает одну пробу по уникальному индексу. INCLUDE позволяет index-only scan.
+        Index(
+            "ix_links_short_code_redirect",
+            "short_code",
+            unique=True,
+            postgresql_include=["id", "original_url", "expires_at", "redirect_status", "cache_max_age"],
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     original_url = Column(String, nullable=False)
-    short_code = Column(String, unique=True, index=True, nullable=False)
-    custom_alias = Column(String, unique=True, index=True, nullable=True)
+    short_code = Column(String, nullable=False)
+    custom_alias = Column(String, nullable=True)
     created_at = Column(TIMESTAMP(timezone=True), default=datetime.utcnow)
     expires_at = Column(TIMESTAMP(timezone=True), nullable=True)
     last_accessed = Column(TIMESTAMP(timezone=True), nullable=True)
     access_count = Column(Integer, default=0)
+    unique_visitors = Column(Integer, default=0, server_default="0")
+    # Политика редиректа: код ответа (301/302/307/308) и max-age для браузеров и CDN
+    redirect_status = Column(Integer, default=307, server_default="307", nullable=False)
+    cache_max_age = Column(Integer, nullable=True)
+    # Время последнего создания или изменения ссылки по часам БД, для дельт edge-снимков.
+    # NULL у ссылок, не менявшихся с момента миграции: они уже есть в любом новом снимке.
+    updated_at = Column(TIMESTAMP(timezone=True), nullable=True, server_default=func.now(), index=True)
 
-    user_id = Column(UUID(as_uuid=True), ForeignKey("user.id"), nullable=True)
+    user_id = Column(Uuid(as_uuid=True), ForeignKey("user.id"), nullable=True)
+
+
+class LinkTombstone(Base):
+    """Запись об удаленной ссылке, чтобы дельта edge-снимка могла передать удаление."""
+    __tablename__ = "link_tombstones"
+
+    id = Column(Integer, primary_key=True)
+    short_code = Column(String, nullable=False)
+    deleted_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now(), index=True)
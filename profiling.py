@@ -0,0 +1,279 @@
+"""Профилирование отдельных запросов: разбивка времени в заголовке Server-Timing.
+
+Включается через PROFILING_ENABLED. Профилируется доля запросов PROFILING_SAMPLE_RATE
+и любой запрос с заголовком `PROFILING_HEADER: <PROFILING_TOKEN>` (только если токен задан).
+Разбивка всегда пишется в лог, а в ответ попадает только для запросов с верным токеном,
+чтобы обычные клиенты не видели внутренние тайминги. Например:
+
+    Server-Timing: redis;dur=0.41;desc="2 calls", db;dur=1.87;desc="2 calls", deps;dur=0.12, app;dur=2.95
+
+Категории: redis, db, auth, deps (разрешение зависимостей FastAPI), serialization
+(валидация и рендер ответа) и app - полное время до начала ответа. Время вложенных
+участков вычитается из внешнего: запрос к БД внутри проверки токена попадает в db, а не в auth.
+
+Если задан PROFILING_FLAMEGRAPH_DIR и установлен pyinstrument, для профилируемого
+запроса пишется профиль в формате speedscope (открывается на https://www.speedscope.app).
+
+При выключенном профилировании middleware не добавляется и хуки не ставятся.
+"""
+import asyncio
+import contextvars
+import os
+import random
+import re
+import secrets
+import time
+from typing import Optional
+
+from config import (
+    PROFILING_SAMPLE_RATE, PROFILING_HEADER, PROFILING_TOKEN,
+    PROFILING_FLAMEGRAPH_DIR, PROFILING_FLAMEGRAPH_INTERVAL,
+)
+
+CATEGORIES = ("redis", "db", "auth", "deps", "serialization")
+
+_current: contextvars.ContextVar[Optional["RequestTimings"]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+class RequestTimings:
+    """Накопленное время по категориям для одного запроса."""
+
+    def __init__(self):
+        self.durations: dict[str, float] = {}
+        self.calls: dict[str, int] = {}
+        # Кадры [категория, начало, время вложенных участков]
+        self._stack: list[list] = []
+
+    def begin(self, category: str) -> None:
+        self._stack.append([category, time.perf_counter(), 0.0])
+
+    def end(self) -> None:
+        if not self._stack:
+            return
+        category, started, nested = self._stack.pop()
+        elapsed = time.perf_counter() - started
+        self.durations[category] = self.durations.get(category, 0.0) + elapsed - nested
+        self.calls[category] = self.calls.get(category, 0) + 1
+        if self._stack:
+            self._stack[-1][2] += elapsed
+
+    def server_timing(self, total: float) -> str:
+        parts = []
+        for category in CATEGORIES:
+            if category in self.durations:
+                calls = self.calls[category]
+                desc = f';desc="{calls} calls"' if calls > 1 else ""
+                parts.append(f"{category};dur={self.durations[category] * 1000:.2f}{desc}")
+        parts.append(f"app;dur={total * 1000:.2f}")
+        return ", ".join(parts)
+
+
+class _Timer:
+    __slots__ = ("timings", "category")
+
+    def __init__(self, timings: RequestTimings, category: str):
+        self.timings = timings
+        self.category = category
+
+    def __enter__(self):
+        self.timings.begin(self.category)
+
+    def __exit__(self, exc_type, exc, tb):
+        self.timings.end()
+
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc, tb):
+        return None
+
+
+_NOOP_TIMER = _NoopTimer()
+
+
+def timed(category: str):
+    """Контекстный менеджер: засчитывает время блока в категорию текущего запроса.
+
+    Вне профилируемого запроса ничего не делает.
+    """
+    timings = _current.get()
+    if timings is None:
+        return _NOOP_TIMER
+    return _Timer(timings, category)
+
+
+# --- Хуки сторонних библиотек ---
+
+_installed = False
+
+
+def _install_sqlalchemy() -> None:
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    # Слушатели на классе Engine действуют на все движки, включая sync_engine async-движков;
+    # SQLAlchemy переносит contextvars в greenlet, так что _current здесь виден
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        timings = _current.get()
+        if timings is not None:
+            timings.begin("db")
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        timings = _current.get()
+        if timings is not None:
+            timings.end()
+
+    @event.listens_for(Engine, "handle_error")
+    def _handle_error(exception_context):
+        timings = _current.get()
+        if timings is not None and exception_context.cursor is not None:
+            timings.end()
+
+
+def _install_redis() -> None:
+    from redis.asyncio.client import Pipeline, Redis
+
+    execute_command = Redis.execute_command
+    pipeline_execute = Pipeline.execute
+
+    async def timed_execute_command(self, *args, **options):
+        with timed("redis"):
+            return await execute_command(self, *args, **options)
+
+    async def timed_pipeline_execute(self, *args, **kwargs):
+        with timed("redis"):
+            return await pipeline_execute(self, *args, **kwargs)
+
+    Redis.execute_command = timed_execute_command
+    Pipeline.execute = timed_pipeline_execute
+
+
+def _install_fastapi() -> None:
+    # get_request_handler вызывает обе функции через глобальные имена модуля fastapi.routing
+    import fastapi.routing
+
+    solve_dependencies = fastapi.routing.solve_dependencies
+    serialize_response = fastapi.routing.serialize_response
+
+    async def timed_solve_dependencies(*args, **kwargs):
+        with timed("deps"):
+            return await solve_dependencies(*args, **kwargs)
+
+    async def timed_serialize_response(*args, **kwargs):
+        with timed("serialization"):
+            return await serialize_response(*args, **kwargs)
+
+    fastapi.routing.solve_dependencies = timed_solve_dependencies
+    fastapi.routing.serialize_response = timed_serialize_response
+
+
+def install() -> None:
+    """Ставит хуки замеров в SQLAlchemy, redis и FastAPI. Повторный вызов ничего не делает."""
+    global _installed
+    if _installed:
+        return
+    _install_sqlalchemy()
+    _install_redis()
+    _install_fastapi()
+    _installed = True
+    if PROFILING_FLAMEGRAPH_DIR and _create_profiler() is None:
+        print("pyinstrument is not installed: flame graphs are disabled")
+
+
+# --- Middleware ---
+
+def _create_profiler():
+    if not PROFILING_FLAMEGRAPH_DIR:
+        return None
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        return None
+    return Profiler(interval=PROFILING_FLAMEGRAPH_INTERVAL, async_mode="enabled")
+
+
+def _write_flamegraph(profiler, method: str, path: str) -> str:
+    from pyinstrument.renderers import SpeedscopeRenderer
+
+    os.makedirs(PROFILING_FLAMEGRAPH_DIR, exist_ok=True)
+    slug = re.sub(r"[^a-zA-Z0-9_-]+", "_", path).strip("_") or "root"
+    filename = f"{time.strftime('%Y%m%dT%H%M%S')}-{time.time_ns() % 1_000_000:06d}-{method}-{slug[:60]}.speedscope.json"
+    file_path = os.path.join(PROFILING_FLAMEGRAPH_DIR, filename)
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write(profiler.output(renderer=SpeedscopeRenderer()))
+    return file_path
+
+
+class ProfilingMiddleware:
+    """ASGI middleware: для выбранных запросов собирает RequestTimings и пишет их в лог.
+
+    Заголовок Server-Timing добавляется только запросам с верным PROFILING_TOKEN.
+
+    Написан на чистом ASGI, а не через BaseHTTPMiddleware, чтобы не добавлять
+    лишнюю задачу и буферизацию к каждому запросу, включая непрофилируемые.
+    """
+
+    def __init__(self, app, sample_rate: float = PROFILING_SAMPLE_RATE):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.header = PROFILING_HEADER.lower().encode("latin-1")
+        self.token = PROFILING_TOKEN.encode("latin-1") if PROFILING_TOKEN else None
+
+    def _select(self, scope) -> tuple[bool, bool]:
+        """Возвращает (профилировать ли запрос, отдавать ли Server-Timing клиенту)."""
+        if self.token is not None:
+            for name, value in scope["headers"]:
+                if name == self.header:
+                    trusted = secrets.compare_digest(value, self.token)
+                    return trusted, trusted
+        return self.sample_rate > 0 and random.random() < self.sample_rate, False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        profile, expose = self._select(scope)
+        if not profile:
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        profiler = _create_profiler()
+        started = time.perf_counter()
+        server_timing = None
+
+        async def send_with_timing(message):
+            nonlocal server_timing
+            if message["type"] == "http.response.start":
+                server_timing = timings.server_timing(time.perf_counter() - started)
+                if expose:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", server_timing.encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        if profiler is not None:
+            profiler.start()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            print(f"Profiled {scope['method']} {scope['path']}: {server_timing}")
+            if profiler is not None:
+                profiler.stop()
+                try:
+                    file_path = await asyncio.to_thread(
+                        _write_flamegraph, profiler, scope["method"], scope["path"]
+                    )
+                    print(f"Flame graph written to {file_path}")
+                except Exception as e:
+                    print(f"Error writing flame graph: {e}")
@@ -1,6 +1,9 @@
 import redis.asyncio as redis
 from config import REDIS_HOST, REDIS_PORT
 
+REDIS_REDIRECT_KEY_PREFIX = "redirect:"
+REDIS_REDIRECT_TTL = 3600
+
 redis_pool = None
 
 def get_redis_pool():